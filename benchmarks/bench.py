@@ -0,0 +1,301 @@
+"""Benchmarks for the detection pipeline and the ground station hot paths.
+
+Suites:
+    detection  synthetic frames at several resolutions through OilSpillDetector,
+               timed per stage (mask, area, regions), and TiledDetector on
+               frames above camera resolution
+    cnn        CnnVerifier batches (needs --model and a TFLite runtime)
+    parser     synthetic telemetry lines through parse_telemetry_line() and
+               batched through parse_telemetry_lines()
+    api        /api/satellites and /api/telemetry through the Flask test client
+
+Every result reports throughput, latency percentiles and Python allocations
+(tracemalloc, so buffers allocated inside OpenCV are not counted). Results are
+compared against benchmarks/baseline.json; baselines only mean something on
+the machine they were recorded on, so re-record them with --save after
+changing hardware.
+
+    python benchmarks/bench.py                  # run everything, compare
+    python benchmarks/bench.py detection api    # selected suites
+    python benchmarks/bench.py --save           # record a new baseline
+    python benchmarks/bench.py --check          # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIR = os.path.join(ROOT, 'service-src')
+RASPBERRY_DIR = os.path.join(ROOT, 'sputnik-frimware', 'raspberry-src')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 720), (1920, 1080)]
+TILED_RESOLUTIONS = [(1920, 1080), (3840, 2160)]
+SUITES = ('detection', 'cnn', 'parser', 'api')
+# A result is a regression when its throughput falls this far below baseline
+DEFAULT_TOLERANCE = 0.25
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 4), 'p95_ms': round(float(p95), 4),
+            'p99_ms': round(float(p99), 4)}
+
+
+def measure(func, iterations, warmup=5):
+    """Time func() per call and count the Python memory it allocates"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    # Separate pass so tracemalloc overhead doesn't skew the timings
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for _ in range(min(iterations, 50)):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+
+    result = {'ops_per_sec': round(iterations / elapsed, 2)}
+    result.update(percentiles(samples))
+    result['alloc_peak_kib'] = round(peak / 1024, 1)
+    result['alloc_retained_kib'] = round(allocated / 1024, 1)
+    return result
+
+
+def synthetic_frame(width, height, seed=0):
+    """Blue, saturated sea with a few grey low-saturation slicks and noise"""
+    import cv2
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[:] = (170, 110, 40)
+    for _ in range(4):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        axes = (int(rng.integers(width // 20, width // 6)), int(rng.integers(height // 20, height // 6)))
+        cv2.ellipse(frame, center, axes, float(rng.integers(0, 180)), 0, 360, (95, 92, 98), -1)
+    noise = rng.integers(-12, 13, frame.shape, dtype=np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def bench_detection(args):
+    sys.path.insert(0, RASPBERRY_DIR)
+    from detection import OilSpillDetector, TiledDetector
+
+    results = {}
+    for width, height in RESOLUTIONS:
+        frame = synthetic_frame(width, height)
+        detector = OilSpillDetector(width=width, height=height)
+        iterations = max(10, int(args.iterations * 640 * 480 / (width * height)))
+        name = f"detection_{width}x{height}"
+
+        mask = detector.compute_mask(frame)
+        results[name + '_mask'] = measure(lambda: detector.compute_mask(frame), iterations)
+        results[name + '_area'] = measure(lambda: detector.detect(frame), iterations)
+        results[name + '_regions'] = measure(lambda: detector.find_regions(frame, mask), iterations)
+
+        def full():
+            _, frame_mask, _ = detector.detect(frame)
+            detector.find_regions(frame, frame_mask)
+        full_result = measure(full, iterations)
+        full_result['fps'] = full_result['ops_per_sec']
+        results[name] = full_result
+
+    # Coarse pass plus full resolution on candidate tiles, for frames above camera size
+    for width, height in TILED_RESOLUTIONS:
+        frame = synthetic_frame(width, height)
+        detector = TiledDetector()
+        iterations = max(10, int(args.iterations * 640 * 480 / (width * height)))
+        tiled_result = measure(lambda: detector.detect(frame), iterations)
+        tiled_result['fps'] = tiled_result['ops_per_sec']
+        results[f"detection_{width}x{height}_tiled"] = tiled_result
+    return results
+
+
+def bench_cnn(args):
+    if not args.model:
+        print("cnn: skipped (pass --model trained_model.tflite)")
+        return {}
+    sys.path.insert(0, RASPBERRY_DIR)
+    from detection import OilSpillDetector, CnnVerifier
+    try:
+        verifier = CnnVerifier(args.model)
+    except ImportError as e:
+        print(f"cnn: skipped ({e})")
+        return {}
+
+    frame = synthetic_frame(640, 480)
+    detector = OilSpillDetector()
+    _, mask, _ = detector.detect(frame)
+    bboxes = [region['bbox'] for region in detector.find_regions(frame, mask)]
+    if not bboxes:
+        bboxes = [(0, 0, 64, 64)]
+    bboxes = (bboxes * verifier.max_per_frame)[:verifier.max_per_frame]
+    roi = frame[:64, :64]
+
+    def uncached():
+        # Clearing the cache forces every region through the model
+        verifier.cache = {}
+        verifier.score_regions(frame, bboxes)
+
+    results = {
+        'cnn_predict': measure(lambda: verifier.predict(roi), args.iterations),
+        f'cnn_batch_{len(bboxes)}': measure(uncached, args.iterations),
+        'cnn_cached': measure(lambda: verifier.score_regions(frame, bboxes), args.iterations),
+    }
+    return results
+
+
+def telemetry_lines(count, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        lines.append(f"ID:{rng.randint(1, 3)},T:{rng.uniform(-20, 60):.1f},B:{rng.uniform(3.2, 4.2):.2f},"
+                     f"S:{rng.randint(-100, -40)},A:{rng.uniform(400, 600):.1f},"
+                     f"V:{rng.uniform(7.0, 8.0):.2f},STATUS:Active")
+    return lines
+
+
+def import_app():
+    # app.py opens satellites.json relative to the working directory
+    os.chdir(SERVICE_DIR)
+    sys.path.insert(0, SERVICE_DIR)
+    import app as service
+    return service
+
+
+def bench_parser(args):
+    service = import_app()
+    lines = telemetry_lines(1000)
+    iterator = iter(lines * 1000)
+
+    results = {
+        'parse_telemetry_line': measure(lambda: service.parse_telemetry_line(next(iterator)),
+                                        args.iterations * 20),
+    }
+    batch = lines[:100]
+    batch_result = measure(lambda: service.parse_telemetry_lines(batch), args.iterations)
+    batch_result['lines_per_sec'] = round(batch_result['ops_per_sec'] * len(batch), 1)
+    results['parse_telemetry_lines_100'] = batch_result
+    return results
+
+
+def bench_api(args):
+    service = import_app()
+    service.parse_telemetry_lines(telemetry_lines(100))
+    client = service.app.test_client()
+
+    etag = client.get('/api/telemetry').headers.get('ETag')
+
+    def get(path, headers=None):
+        response = client.get(path, headers=headers)
+        if response.status_code not in (200, 304):
+            raise RuntimeError(f"{path}: HTTP {response.status_code}")
+
+    results = {
+        'api_satellites': measure(lambda: get('/api/satellites'), args.iterations),
+        'api_telemetry': measure(lambda: get('/api/telemetry'), args.iterations),
+        'api_telemetry_304': measure(lambda: get('/api/telemetry', {'If-None-Match': etag}),
+                                     args.iterations),
+        'api_telemetry_one': measure(lambda: get('/api/telemetry/1'), args.iterations),
+    }
+    for result in results.values():
+        result['requests_per_sec'] = result['ops_per_sec']
+    return results
+
+
+SUITE_FUNCTIONS = {
+    'detection': bench_detection,
+    'cnn': bench_cnn,
+    'parser': bench_parser,
+    'api': bench_api,
+}
+
+
+def machine_info():
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'cpus': os.cpu_count()}
+
+
+def compare(results, baseline, tolerance):
+    """Print each result against the baseline and return the regressed names"""
+    regressions = []
+    print(f"{'benchmark':<36}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'alloc KiB':>11}{'vs base':>10}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = ''
+        if base:
+            ratio = result['ops_per_sec'] / base['ops_per_sec']
+            change = f"{(ratio - 1) * 100:+.0f}%"
+            if ratio < 1 - tolerance:
+                change += ' !'
+                regressions.append(name)
+        print(f"{name:<36}{result['ops_per_sec']:>12.1f}{result['p50_ms']:>10.3f}"
+              f"{result['p99_ms']:>10.3f}{result['alloc_peak_kib']:>11.1f}{change:>10}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark detection and telemetry hot paths")
+    parser.add_argument('suites', nargs='*', help=f"suites to run: {', '.join(SUITES)} (default: all)")
+    parser.add_argument('--iterations', type=int, default=200,
+                        help="iterations per benchmark (scaled down for large frames)")
+    parser.add_argument('--model', help="TFLite model for the cnn suite")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="write results as the new baseline")
+    parser.add_argument('--check', action='store_true', help="exit 1 if any benchmark regressed")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error(f"unknown suite {suite!r}")
+
+    results = {}
+    for suite in args.suites or SUITES:
+        print(f"Running {suite}...")
+        results.update(SUITE_FUNCTIONS[suite](args))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved.get('results', {})
+        if saved.get('machine') != machine_info():
+            print(f"Note: baseline was recorded on {saved.get('machine')}")
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        # Keep baselines of suites that weren't run this time
+        merged = dict(baseline)
+        merged.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': machine_info(), 'results': merged}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} regressions (> {args.tolerance:.0%} slower): {', '.join(regressions)}")
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,439 @@
+"""Load generation and capture replay through the real telemetry ingestion path.
+
+Frames are written into a pseudo-terminal and read back by a SerialSource,
+so they take the same path as a receiver on /dev/ttyUSB0: TelemetryDecoder,
+frame de-duplication, store_telemetry_frames(), the history, the rollups and
+the SQLite writer. Probe frames from a reserved satellite id carry a sequence
+number in their altitude; /api/telemetry/<probe id> is polled to measure the
+time from writing a frame to seeing it through the API.
+
+    python benchmarks/loadgen.py generate --rate 5000 --satellites 200 --duration 30
+    python benchmarks/loadgen.py generate --format binary --rate 2000
+    python benchmarks/loadgen.py record /dev/ttyUSB0 pass.cap --duration 600
+    python benchmarks/loadgen.py replay pass.cap --speed 10      # 10x faster, 0 = flat out
+    python benchmarks/loadgen.py replay frames.txt --rate 1000   # one frame per line
+
+By default the app is imported and fed in this process, with the database in
+a temporary file. To load a running server instead, expose the pty at a fixed
+path, start the server on it and give loadgen its URL:
+
+    python benchmarks/loadgen.py generate --link /tmp/ttySIM --url http://127.0.0.1:5000 --wait 10
+    TELEMETRY_SOURCES=serial:/tmp/ttySIM python service-src/app.py
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tty
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIR = os.path.join(ROOT, 'service-src')
+sys.path.insert(0, SERVICE_DIR)
+
+from telemetry_parser import STATUSES, encode_binary_frame  # noqa: E402
+
+# Capture file: magic, then one record per received chunk
+CAPTURE_MAGIC = b'TLMCAP1\n'
+CAPTURE_RECORD = struct.Struct('<dI')  # seconds since the capture started, chunk length
+PROBE_ID = 255
+PROBE_INTERVAL = 0.05
+# Probe altitudes are seq / 10 modulo this, inside the parser's 0-2000 km range
+PROBE_MODULO = 20000
+POLL_INTERVAL = 0.001
+# Frames due are written together every TICK seconds
+TICK = 0.005
+# Distinct synthetic frames generated up front and then cycled
+POOL_SIZE = 20000
+
+
+def synthetic_frame(rng, satellite_id, fmt):
+    data = {
+        'satellite_id': satellite_id,
+        'temperature': round(rng.uniform(-20, 50), 1),
+        'battery': round(rng.uniform(3.0, 4.2), 3),
+        'signal_strength': rng.randint(-110, -30),
+        'altitude': round(rng.uniform(400, 600), 1),
+        'speed': round(rng.uniform(7.5, 7.8), 2),
+        'status': rng.choice(STATUSES),
+    }
+    if fmt == 'binary' or (fmt == 'mixed' and rng.random() < 0.5):
+        return encode_binary_frame(data)
+    return (f"ID:{satellite_id},T:{data['temperature']},B:{data['battery']},S:{data['signal_strength']},"
+            f"A:{data['altitude']},V:{data['speed']},STATUS:{data['status']}\n").encode()
+
+
+def synthetic_batches(rate, satellites, fmt, duration, seed=0):
+    """Yield (offset, data, frames) writing `rate` frames per second round-robin over the satellites"""
+    rng = random.Random(seed)
+    pool = [synthetic_frame(rng, i % satellites + 1, fmt) for i in range(POOL_SIZE)]
+    return paced(pool, rate, duration, cycle=True)
+
+
+def paced(frames, rate, duration=None, cycle=False):
+    sent = 0
+    tick = 0
+    while duration is None or tick * TICK < duration:
+        due = int(rate * (tick + 1) * TICK)
+        if not cycle:
+            due = min(due, len(frames))
+        batch = [frames[i % len(frames)] for i in range(sent, due)]
+        if batch:
+            yield tick * TICK, b''.join(batch), len(batch)
+        sent = due
+        tick += 1
+        if not cycle and sent >= len(frames):
+            return
+
+
+def read_capture(path):
+    """Yield (offset, chunk) from a capture written by `record`"""
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a telemetry capture")
+        while True:
+            header = f.read(CAPTURE_RECORD.size)
+            if len(header) < CAPTURE_RECORD.size:
+                return
+            offset, length = CAPTURE_RECORD.unpack(header)
+            yield offset, f.read(length)
+
+
+def is_capture(path):
+    with open(path, 'rb') as f:
+        return f.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+
+
+def capture_batches(path, speed, duration=None):
+    for offset, chunk in read_capture(path):
+        offset = offset / speed if speed else 0.0
+        if duration is not None and offset >= duration:
+            return
+        # Frame count is unknown until parsed; the ingestion stats report it
+        yield offset, chunk, None
+
+
+def line_batches(path, rate, duration=None):
+    with open(path, 'rb') as f:
+        frames = [line.rstrip(b'\r\n') + b'\n' for line in f if line.strip()]
+    return paced(frames, rate, duration)
+
+
+class ApiClient:
+    """GET JSON from the app, in process through the test client or over HTTP"""
+
+    def __init__(self, service=None, url=None):
+        self.test_client = service.app.test_client() if service is not None else None
+        self.url = url.rstrip('/') if url else None
+
+    def get(self, path, etag=None):
+        """Return (status, etag, data)"""
+        headers = {'If-None-Match': etag} if etag else {}
+        if self.test_client is not None:
+            response = self.test_client.get(path, headers=headers)
+            data = response.get_json() if response.status_code == 200 else None
+            return response.status_code, response.headers.get('ETag'), data
+        request = urllib.request.Request(self.url + path, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, response.headers.get('ETag'), json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('ETag'), None
+
+
+class LatencyProbe:
+    """Probe frames and the poller that notices them through the API.
+
+    Each probe gets a distinct altitude. When the poller sees a probe, that
+    probe's latency is recorded and older probes still pending count as
+    superseded: the API moved past them before a poll caught them.
+    """
+
+    def __init__(self, client, satellite_id=PROBE_ID):
+        self.client = client
+        self.satellite_id = satellite_id
+        self.seq = 0
+        # altitude -> (seq, write time)
+        self.pending = {}
+        self.latencies = []
+        self.superseded = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def frame(self):
+        """Return (altitude, line) for the next probe"""
+        self.seq += 1
+        altitude = round(self.seq % PROBE_MODULO / 10, 1)
+        line = f"ID:{self.satellite_id},T:0.0,B:4.0,S:-50,A:{altitude},V:7.6,STATUS:Active\n"
+        return altitude, line.encode()
+
+    def written(self, altitude, when):
+        with self.lock:
+            self.pending[altitude] = (self.seq, when)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._poll, daemon=True, name='latency-probe')
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Wait up to timeout for pending probes to show up, then stop polling"""
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.stopping.set()
+        self.thread.join()
+
+    def _poll(self):
+        path = f"/api/telemetry/{self.satellite_id}"
+        etag = None
+        while not self.stopping.is_set():
+            try:
+                status, new_etag, data = self.client.get(path, etag)
+            except OSError as e:
+                print(f"Probe poll failed: {e}")
+                time.sleep(0.5)
+                continue
+            seen = time.perf_counter()
+            if status == 200 and data:
+                etag = new_etag
+                self._seen(round(data.get('altitude', -1), 1), seen)
+            time.sleep(POLL_INTERVAL)
+
+    def _seen(self, altitude, seen):
+        with self.lock:
+            entry = self.pending.pop(altitude, None)
+            if entry is None:
+                return
+            seq, written = entry
+            self.latencies.append(seen - written)
+            for key, (other, _) in list(self.pending.items()):
+                if other < seq:
+                    del self.pending[key]
+                    self.superseded += 1
+
+    def summary(self):
+        with self.lock:
+            result = {'probes': self.seq, 'seen': len(self.latencies),
+                      'superseded': self.superseded, 'lost': len(self.pending)}
+            if self.latencies:
+                values = np.array(self.latencies) * 1000
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                result.update({'p50_ms': round(float(p50), 2), 'p95_ms': round(float(p95), 2),
+                               'p99_ms': round(float(p99), 2), 'max_ms': round(float(values.max()), 2)})
+            return result
+
+
+def open_pty(link=None):
+    """Return (master fd, slave fd, slave path); the slave fd is held so the pty survives reconnects"""
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    if link:
+        if os.path.islink(link):
+            os.unlink(link)
+        os.symlink(path, link)
+        path = link
+    return master, slave, path
+
+
+def write_batches(fd, batches, probe):
+    """Write batches at their offsets, injecting a probe every PROBE_INTERVAL"""
+    written_frames = 0
+    written_bytes = 0
+    start = time.perf_counter()
+    next_probe = start
+    for offset, data, frames in batches:
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        view = memoryview(data)
+        while view:
+            # Blocks when the reader falls behind, like a receiver's full buffer
+            view = view[os.write(fd, view):]
+        written_bytes += len(data)
+        written_frames += frames or 0
+        now = time.perf_counter()
+        if probe is not None and now >= next_probe:
+            altitude, line = probe.frame()
+            # Registered before the write, or the poller could see it first
+            probe.written(altitude, time.perf_counter())
+            os.write(fd, line)
+            next_probe = now + PROBE_INTERVAL
+    return written_frames, written_bytes, time.perf_counter() - start
+
+
+def wait_for_ingestion(client, before, timeout=10.0):
+    """Poll the parser counters until they stop moving; return the final counters"""
+    stats = before
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.5)
+        _, _, latest = client.get('/api/telemetry/stats')
+        if latest == stats:
+            break
+        stats = latest
+    return stats
+
+
+def start_in_process(pty_path, db_path):
+    # app.py opens satellites.json relative to the working directory
+    os.chdir(SERVICE_DIR)
+    import app as service
+    from telemetry_store import TelemetryStore
+
+    service.telemetry_store = TelemetryStore(db_path, batch_size=500, flush_interval=1.0, retention_days=30)
+    service.telemetry_store.start()
+    service.TELEMETRY_SOURCES = f"serial:{pty_path}"
+    service.read_telemetry()
+    return service
+
+
+def run_load(args, batches):
+    master, slave, pty_path = open_pty(args.link)
+    service = None
+    db_dir = None
+    if args.url:
+        client = ApiClient(url=args.url)
+        print(f"Writing to {pty_path}; waiting {args.wait}s for {args.url} to open it")
+        time.sleep(args.wait)
+    else:
+        db_dir = tempfile.TemporaryDirectory()
+        service = start_in_process(pty_path, args.db or os.path.join(db_dir.name, 'telemetry.db'))
+        client = ApiClient(service=service)
+        time.sleep(args.wait)
+
+    probe = LatencyProbe(client, args.probe_id)
+    probe.start()
+    _, _, before = client.get('/api/telemetry/stats')
+    try:
+        frames, size, elapsed = write_batches(master, batches, probe)
+        probe.stop()
+        after = wait_for_ingestion(client, before)
+    finally:
+        if service is not None and service.telemetry_ingestor is not None:
+            service.telemetry_ingestor.stop()
+            service.telemetry_store.stop()
+        os.close(master)
+        os.close(slave)
+        if args.link and os.path.islink(args.link):
+            os.unlink(args.link)
+        if db_dir is not None:
+            db_dir.cleanup()
+
+    results = {
+        'written': {'frames': frames or None, 'bytes': size, 'seconds': round(elapsed, 3),
+                    'frames_per_sec': round(frames / elapsed, 1) if frames and elapsed else None},
+        'ingested': {key: after[key] - before[key] for key in after} if before and after else None,
+        'latency': probe.summary(),
+    }
+    return results
+
+
+def print_results(results):
+    written = results['written']
+    print(f"Wrote {written['bytes']} bytes in {written['seconds']}s"
+          + (f": {written['frames']} frames, {written['frames_per_sec']} frames/s" if written['frames'] else ""))
+    if results['ingested']:
+        ingested = results['ingested']
+        print(f"Ingested {ingested['frames']} frames ({ingested['malformed']} malformed, "
+              f"{ingested['ignored']} ignored)")
+    latency = results['latency']
+    line = (f"Latency probes: {latency['seen']}/{latency['probes']} seen, "
+            f"{latency['superseded']} superseded, {latency['lost']} lost")
+    if 'p50_ms' in latency:
+        line += (f"; write to API p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, "
+                 f"p99 {latency['p99_ms']} ms, max {latency['max_ms']} ms")
+    print(line)
+
+
+def record(args):
+    """Save what a receiver sends, with timing, for replay"""
+    import serial
+
+    conn = serial.Serial(args.port, args.baud, timeout=0.5)
+    chunks = 0
+    start = time.perf_counter()
+    try:
+        with open(args.capture, 'wb') as f:
+            f.write(CAPTURE_MAGIC)
+            while args.duration is None or time.perf_counter() - start < args.duration:
+                chunk = conn.read(conn.in_waiting or 1)
+                if not chunk:
+                    continue
+                f.write(CAPTURE_RECORD.pack(time.perf_counter() - start, len(chunk)) + chunk)
+                chunks += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+    print(f"Recorded {chunks} chunks in {time.perf_counter() - start:.1f}s to {args.capture}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the telemetry ingestion path through a pty")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load_options = argparse.ArgumentParser(add_help=False)
+    load_options.add_argument('--duration', type=float, help="seconds to run (default: 10 for generate)")
+    load_options.add_argument('--url', help="load a running server at this URL instead of an in-process app")
+    load_options.add_argument('--link', help="also expose the pty at this path (for --url)")
+    load_options.add_argument('--wait', type=float, default=1.0,
+                              help="seconds to wait for the reader to open the pty")
+    load_options.add_argument('--db', help="in-process telemetry database (default: a temporary file)")
+    load_options.add_argument('--probe-id', type=int, default=PROBE_ID,
+                              help="satellite id reserved for latency probes")
+    load_options.add_argument('--output', help="also write the results as JSON to this file")
+
+    generate = commands.add_parser('generate', parents=[load_options], help="synthetic frames at a fixed rate")
+    generate.add_argument('--rate', type=int, default=1000, help="frames per second")
+    generate.add_argument('--satellites', type=int, default=100)
+    generate.add_argument('--format', choices=('ascii', 'binary', 'mixed'), default='ascii')
+    generate.add_argument('--seed', type=int, default=0)
+
+    replay = commands.add_parser('replay', parents=[load_options],
+                                 help="a capture from `record` (timed) or a text file of frames")
+    replay.add_argument('capture')
+    replay.add_argument('--speed', type=float, default=1.0,
+                        help="capture playback speed; 0 writes as fast as possible")
+    replay.add_argument('--rate', type=int, default=1000, help="frames per second for text files")
+
+    recorder = commands.add_parser('record', help="save a receiver's output for replay")
+    recorder.add_argument('port')
+    recorder.add_argument('capture')
+    recorder.add_argument('--baud', type=int, default=9600)
+    recorder.add_argument('--duration', type=float)
+
+    args = parser.parse_args(argv)
+    if args.command == 'record':
+        return record(args)
+
+    if args.command == 'generate':
+        if not 1 <= args.satellites < args.probe_id:
+            parser.error(f"--satellites must be between 1 and {args.probe_id - 1}")
+        batches = synthetic_batches(args.rate, args.satellites, args.format,
+                                    args.duration or 10.0, args.seed)
+    elif is_capture(args.capture):
+        batches = capture_batches(args.capture, args.speed, args.duration)
+    else:
+        batches = line_batches(args.capture, args.rate, args.duration)
+
+    results = run_load(args, batches)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,10 +12,18 @@
  * A = Altitude in km
  * V = Orbital velocity in km/s
  * STATUS = Satellite status
+ *
+ * With BINARY_TELEMETRY set to 1 the same data is sent as a 14-byte frame
+ * instead (see service-src/telemetry_parser.py):
+ * 0xAA 0x55 | id u8 | temp*10 i16 | battery mV u16 | signal i8 |
+ * altitude*10 u16 | velocity*100 u16 | status u8 | CRC-8 (poly 0x07)
+ * Multi-byte fields are little endian.
  */
 
 #include <SoftwareSerial.h>
 
+#define BINARY_TELEMETRY 0
+
 struct SatelliteData {
   int id;
   float temperature;
@@ -51,6 +59,7 @@ void loop() {
     sendTelemetry(currentSatellite);
     currentSatellite = (currentSatellite + 1) % 6;
   }
+  checkForCommands();
   delay(100);
 }
 
@@ -113,8 +122,50 @@ void updateSatelliteData(int satelliteIndex) {
   }
 }
 
+uint8_t crc8(const uint8_t* data, int length) {
+  uint8_t crc = 0;
+  for (int i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void putInt16(uint8_t* buf, int16_t value) {
+  buf[0] = value & 0xFF;
+  buf[1] = (value >> 8) & 0xFF;
+}
+
+uint8_t statusCode(const String& status) {
+  if (status == "Inactive") return 1;
+  if (status == "Maintenance") return 2;
+  return 0;
+}
+
+void sendTelemetryBinary(const SatelliteData& sat) {
+  uint8_t frame[14];
+  frame[0] = 0xAA;
+  frame[1] = 0x55;
+  frame[2] = (uint8_t)sat.id;
+  putInt16(&frame[3], (int16_t)round(sat.temperature * 10));
+  putInt16(&frame[5], (int16_t)(uint16_t)round(sat.battery * 1000));
+  frame[7] = (uint8_t)(int8_t)sat.signalStrength;
+  putInt16(&frame[8], (int16_t)(uint16_t)round(sat.altitude * 10));
+  putInt16(&frame[10], (int16_t)(uint16_t)round(sat.velocity * 100));
+  frame[12] = statusCode(sat.status);
+  frame[13] = crc8(&frame[2], 11);
+  Serial.write(frame, sizeof(frame));
+}
+
 void sendTelemetry(int satelliteIndex) {
   SatelliteData sat = satellites[satelliteIndex];
+#if BINARY_TELEMETRY
+  // Compact frame only; the human-readable summary would eat the link time
+  sendTelemetryBinary(sat);
+  return;
+#endif
   String telemetry = "ID:" + String(sat.id) + 
                      ",T:" + String(sat.temperature, 1) + 
                      ",B:" + String(sat.battery, 2) + 
@@ -146,7 +197,15 @@ void checkForCommands() {
     String command = Serial.readStringUntil('\n');
     command.trim();
     
-    if (command == "RESET") {
+    if (command.startsWith("CMD:")) {
+      // Uplink command CMD:<id>:<sat>:<command>; the simulated satellites
+      // acknowledge it right away the way the Pi does after executing it
+      int idEnd = command.indexOf(':', 4);
+      if (idEnd > 4) {
+        Serial.print("CMD_ACK:");
+        Serial.println(command.substring(4, idEnd));
+      }
+    } else if (command == "RESET") {
       initializeSatellites();
       Serial.println("Satellite data reset");
     } else if (command.startsWith("SET_STATUS:")) {
@@ -1,10 +1,23 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session, flash
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, session, flash, g
 import os
 import json
-import serial
+import math
 import threading
 import time
 from functools import wraps
+from satellite_registry import SatelliteRegistry
+from telemetry_history import TelemetryHistory
+from telemetry_rollups import TelemetryRollups, LOW_SIGNAL_DBM
+from telemetry_stream import TelemetryBroadcaster
+from telemetry_parser import parse_lines, is_health_frame
+from telemetry_store import TelemetryStore
+from ingestion import TelemetryIngestor, parse_source_spec, detect_serial_sources, SERIAL_PORTS, BAUD_RATE
+from image_downlink import image_reassembler
+from metrics import metrics, profiler, TimedLock
+from telemetry_service import (TelemetryServiceClient, RemoteImages, RemoteCommands, ingestion_stats,
+                               ingestion_metric_families)
+from command_queue import CommandQueue
+from http_cache import ResponseCache, StaticAssets, compress_response, matching_etag
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
@@ -13,9 +26,30 @@ app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
 ADMIN_USERNAME = 'admin'
 ADMIN_PASSWORD = 'admin123'
 
+# Exposed at /metrics; other counters are read from their owners at scrape time
+request_seconds = metrics.histogram('http_request_duration_seconds', 'Request latency by route',
+                                    labels=('method', 'route', 'status'))
+lock_wait_seconds = metrics.histogram('lock_wait_seconds', 'Time spent waiting to acquire a lock',
+                                      labels=('lock',))
+frames_ingested = metrics.counter('telemetry_frames_ingested_total',
+                                  'Telemetry frames stored after deduplication')
+
 # Global variables for telemetry
+# Latest frame per satellite, keyed by satellite_id
 telemetry_data = {}
-telemetry_lock = threading.Lock()
+telemetry_lock = TimedLock(lock_wait_seconds, 'telemetry_lock')
+# Bumped on every frame; used to build ETags for polling clients
+telemetry_version = 0
+telemetry_versions = {}
+telemetry_epoch = int(time.time())
+# Pushes each frame to connected SSE clients
+telemetry_broadcaster = TelemetryBroadcaster(max_queue=100)
+# On-disk log of every frame; the last WARM_LOAD_SECONDS are replayed at startup
+telemetry_store = TelemetryStore('telemetry.db', batch_size=500, flush_interval=1.0, retention_days=30)
+WARM_LOAD_SECONDS = 6 * 3600
+telemetry_history = TelemetryHistory(capacity=10000)
+# 1 s / 1 min / 1 h aggregates for long-range charts, rebuilt from the store at startup
+telemetry_rollups = TelemetryRollups()
 
 # Login required decorator for admin only
 def admin_required(f):
@@ -26,183 +60,185 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Serial communication with Arduino
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        # Label by route pattern, not path, so /satellite/<id> is one series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_seconds.observe(time.perf_counter() - started,
+                                request.method, route, str(response.status_code))
+    return response
+
+# Registered after record_request_latency, so it runs first and compression time is measured
+app.after_request(compress_response)
+# Serialized API responses, rebuilt only when the underlying data version changes
+response_cache = ResponseCache()
+# Static files behind fingerprinted ?v= URLs, text assets pre-compressed
+static_assets = StaticAssets(app.static_folder)
+app.url_defaults(static_assets.url_defaults)
+app.view_functions['static'] = static_assets.serve
+
+def not_modified(etag):
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+# Serial communication with Arduino (SERIAL_PORTS / BAUD_RATE live in ingestion.py)
+# Explicit receiver list, e.g. "serial:/dev/ttyUSB0,serial:/dev/ttyUSB1,tcp:10.0.0.5:4000,udp:0.0.0.0:5005".
+# When unset every port in SERIAL_PORTS that can be opened is used.
+TELEMETRY_SOURCES = os.environ.get('TELEMETRY_SOURCES', '')
+telemetry_ingestor = None
+# Address of a running telemetry_service.py, e.g. "127.0.0.1:5055". When set the
+# receivers are read by that process and this one only follows its frames.
+TELEMETRY_SERVICE = os.environ.get('TELEMETRY_SERVICE', '')
+telemetry_client = None
+# Completed downlinked images: local reassembler or the service's
+image_store = image_reassembler
+
+def send_uplink(line):
+    return telemetry_ingestor.send_uplink(line) if telemetry_ingestor else False
+
+# Uplink commands to the satellites, acknowledged over the downlink
+# (replaced by the service's queue when following a telemetry service)
+command_queue = CommandQueue(send_uplink)
+
 def read_telemetry():
-    """Read telemetry data from Arduino via serial/UART"""
-    try:
-        # Try different serial ports
-        ports = ['/dev/ttyUSB0', '/dev/ttyACM0', '/dev/tty.usbserial-1410', 'COM3']
-        ser = None
-        
-        for port in ports:
-            try:
-                ser = serial.Serial(port, 9600, timeout=1)
-                print(f"Connected to Arduino on {port}")
-                break
-            except serial.SerialException:
-                continue
-        
-        if not ser:
-            print("Arduino not found. Using simulated data.")
-            simulate_telemetry()
-            return
-        
-        while True:
-            try:
-                if ser.in_waiting > 0:
-                    line = ser.readline().decode('utf-8').strip()
-                    if line:
-                        parse_telemetry_line(line)
-                time.sleep(0.1)
-            except serial.SerialException as e:
-                print(f"Serial error: {e}")
-                break
-            except Exception as e:
-                print(f"Error reading telemetry: {e}")
-                break
-        
-        if ser:
-            ser.close()
-            
-    except Exception as e:
-        print(f"Telemetry error: {e}")
+    """Read telemetry data from every configured receiver"""
+    global telemetry_ingestor
+    if TELEMETRY_SOURCES:
+        sources = parse_source_spec(TELEMETRY_SOURCES)
+    else:
+        sources = detect_serial_sources(SERIAL_PORTS, BAUD_RATE)
+    
+    if not sources:
+        print("Arduino not found. Using simulated data.")
         simulate_telemetry()
+        return
+    
+    # One thread per receiver; frames heard by several receivers are stored once
+    telemetry_ingestor = TelemetryIngestor(sources, store_telemetry_frames,
+                                           image_reassembler=image_reassembler,
+                                           command_handler=command_queue.acknowledge)
+    telemetry_ingestor.start()
 
 def simulate_telemetry():
     """Simulate telemetry data when Arduino is not connected"""
     import random
     
     while True:
-        with telemetry_lock:
-            telemetry_data = {
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'satellite_id': random.randint(1, 6),
-                'temperature': round(random.uniform(-20, 50), 2),
-                'battery': round(random.uniform(3.0, 4.2), 2),
-                'signal_strength': round(random.uniform(-80, -30), 2),
-                'altitude': round(random.uniform(480, 600), 2),
-                'speed': round(random.uniform(7.5, 7.8), 2),
-                'status': random.choice(['Active', 'Inactive', 'Maintenance'])
-            }
+        # Same path as received frames, so history, rollups, SSE and the store see them too
+        store_telemetry_frames([{
+            'satellite_id': random.randint(1, 6),
+            'temperature': round(random.uniform(-20, 50), 2),
+            'battery': round(random.uniform(3.0, 4.2), 2),
+            'signal_strength': round(random.uniform(-80, -30), 2),
+            'altitude': round(random.uniform(480, 600), 2),
+            'speed': round(random.uniform(7.5, 7.8), 2),
+            'status': random.choice(['Active', 'Inactive', 'Maintenance'])
+        }])
         time.sleep(5)
 
+def store_telemetry_frames(frames, now=None, first_version=None):
+    """Apply a batch of parsed frames under one lock acquisition.
+
+    now and first_version are given when following the ingestion service, so
+    every worker stamps and numbers frames the same way. The timestamp is
+    taken and the history, rollups, store and SSE clients are fed under the
+    same lock, so concurrent receivers can't append out of time order.
+    """
+    global telemetry_version
+    with telemetry_lock:
+        if now is None:
+            now = time.time()
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+        if first_version is not None:
+            telemetry_version = first_version - 1
+        for data in frames:
+            data['timestamp'] = timestamp
+            satellite_id = data['satellite_id']
+            state = telemetry_data.setdefault(satellite_id, {})
+            state.update(data)
+            telemetry_version += 1
+            telemetry_versions[satellite_id] = telemetry_version
+            snapshot = dict(state)
+            # Pipeline health only updates the latest state and SSE clients
+            if not is_health_frame(data):
+                telemetry_history.append(satellite_id, now, data)
+                telemetry_rollups.add(satellite_id, now, data)
+                telemetry_store.add(satellite_id, now, data)
+            telemetry_broadcaster.publish(snapshot)
+    frames_ingested.inc(amount=len(frames))
+
+def warm_load_telemetry():
+    """Fill the in-memory history and latest state from the on-disk store"""
+    rows = telemetry_store.load_recent(WARM_LOAD_SECONDS)
+    with telemetry_lock:
+        for row in rows:
+            satellite_id = row['satellite_id']
+            timestamp = row['timestamp']
+            telemetry_history.append(satellite_id, timestamp, row)
+            latest = dict(row)
+            latest['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+            telemetry_data.setdefault(satellite_id, {}).update(latest)
+    print(f"Loaded {len(rows)} telemetry samples from {telemetry_store.path}")
+    telemetry_rollups.backfill(telemetry_store)
+
+def apply_service_snapshot(message):
+    """Replace the latest state with the ingestion service's on (re)connect"""
+    global telemetry_version, telemetry_epoch
+    with telemetry_lock:
+        telemetry_epoch = message['epoch']
+        telemetry_version = message['version']
+        telemetry_versions.clear()
+        telemetry_versions.update((int(sid), v) for sid, v in message['versions'].items())
+        # Keep warm-loaded satellites the service hasn't heard from since it started
+        for sid, data in message['latest'].items():
+            telemetry_data[int(sid)] = data
+    print(f"Following telemetry service {telemetry_client.address} at version {telemetry_version}")
+
+def apply_service_frames(message):
+    store_telemetry_frames(message['frames'], message['time'], message['version'])
+
+def current_ingestion_stats():
+    """Parser, receiver and store counters from wherever ingestion runs"""
+    if telemetry_client is not None:
+        return telemetry_client.request('stats')
+    return ingestion_stats(telemetry_ingestor, telemetry_store)
+
+def collect_telemetry_metrics():
+    """Metric families read from the parser, sources, store and SSE clients"""
+    families = [
+        ('telemetry_stream_clients', 'gauge', 'Connected SSE clients',
+         [({}, len(telemetry_broadcaster.subscribers))]),
+    ]
+    # With a separate ingestion service these come from its own /metrics text
+    if telemetry_client is None:
+        families.extend(ingestion_metric_families(current_ingestion_stats()))
+    return families
+
+metrics.register_collector(collect_telemetry_metrics)
+
+def parse_telemetry_lines(lines):
+    """Parse telemetry lines from Arduino and store the valid frames"""
+    # Expected format: ID:1,T:25.5,B:3.7,S:-45,A:520,V:7.6,STATUS:Active
+    frames = parse_lines(lines)
+    if frames:
+        store_telemetry_frames(frames)
+
 def parse_telemetry_line(line):
     """Parse telemetry data from Arduino"""
-    try:
-        # Expected format: ID:1,T:25.5,B:3.7,S:-45,A:520,V:7.6,STATUS:Active
-        parts = line.split(',')
-        data = {}
-        
-        for part in parts:
-            if ':' in part:
-                key, value = part.split(':', 1)
-                if key == 'ID':
-                    data['satellite_id'] = int(value)
-                elif key == 'T':
-                    data['temperature'] = float(value)
-                elif key == 'B':
-                    data['battery'] = float(value)
-                elif key == 'S':
-                    data['signal_strength'] = float(value)
-                elif key == 'A':
-                    data['altitude'] = float(value)
-                elif key == 'V':
-                    data['speed'] = float(value)
-                elif key == 'STATUS':
-                    data['status'] = value
-        
-        data['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S')
-        
-        with telemetry_lock:
-            telemetry_data.update(data)
-            
-    except Exception as e:
-        print(f"Error parsing telemetry: {e}")
+    parse_telemetry_lines([line])
+
+# Satellite data is kept in memory and persisted to satellites.json
+satellite_registry = SatelliteRegistry('satellites.json')
 
-# Load satellite data from JSON file
 def load_satellites():
-    try:
-        with open('satellites.json', 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # Return default data if file doesn't exist or is invalid
-        default_data = [
-            {
-                'id': 1,
-                'name': 'SITeye-1',
-                'status': 'Active',
-                'launch_date': '2026-01-27',
-                'mission': 'Сеть дистанционного зондирования Земли',
-                'altitude': '520 km',
-                'last_contact': '2026-01-27 14:30:22',
-                'description': 'Спутник дистанционного зондирования формата 1U',
-                'image': '1.png',
-                'owner': 'admin'
-            },
-            {
-                'id': 2,
-                'name': 'SITeye-2',
-                'status': 'Active',
-                'launch_date': '2026-01-27',
-                'mission': 'Сеть дистанционного зондирования Земли',
-                'altitude': '540 km',
-                'last_contact': '2026-01-27 15:45:10',
-                'description': 'Спутник дистанционного зондирования формата 1U',
-                'image': '2.png',
-                'owner': 'admin'
-            },
-            {
-                'id': 3,
-                'name': 'SITeye-3',
-                'status': 'Maintenance',
-                'launch_date': '2026-01-27',
-                'mission': 'Сеть дистанционного зондирования Земли',
-                'altitude': '510 km',
-                'last_contact': '2026-01-25 09:20:15',
-                'description': 'Спутник дистанционного зондирования формата 1U',
-                'image': '3.png',
-                'owner': 'user'
-            },
-            {
-                'id': 4,
-                'name': 'SITeye-4',
-                'status': 'Active',
-                'launch_date': '2026-01-27',
-                'mission': 'Сеть дистанционного зондирования Земли',
-                'altitude': '530 km',
-                'last_contact': '2026-01-27 16:10:45',
-                'description': 'Спутник дистанционного зондирования формата 1U',
-                'image': '4.png',
-                'owner': 'admin'
-            },
-            {
-                'id': 5,
-                'name': 'SITeye-5',
-                'status': 'Inactive',
-                'launch_date': '2026-01-27',
-                'mission': 'Сеть дистанционного зондирования Земли',
-                'altitude': '480 km',
-                'last_contact': '2026-01-20 22:10:33',
-                'description': 'Спутник дистанционного зондирования формата 1U',
-                'image': '5.png',
-                'owner': 'user'
-            },
-            {
-                'id': 6,
-                'name': 'SITeye-6',
-                'status': 'Active',
-                'launch_date': '2026-01-27',
-                'mission': 'Сеть дистанционного зондирования Земли',
-                'altitude': '510 km',
-                'last_contact': '2026-01-27 10:05:17',
-                'description': 'Спутник дистанционного зондирования формата 1U',
-                'image': '6.png',
-                'owner': 'admin'
-            }
-        ]
-        with open('satellites.json', 'w') as f:
-            json.dump(default_data, f, indent=2)
-        return default_data
+    return satellite_registry.all()
 
 @app.route('/')
 def home():
@@ -233,23 +269,28 @@ def dashboard():
 @app.route('/profile')
 def profile():
     username = session.get('username', 'guest')
-    satellites = load_satellites()
-    user_satellites = satellites  # All satellites visible to guest users
+    # All satellites visible to guest users
+    satellite_count, active_satellites = satellite_registry.stats()
     return render_template('profile.html', 
                          username=username,
-                         satellite_count=len(user_satellites),
-                         active_satellites=sum(1 for s in user_satellites if s['status'] == 'Active'))
+                         satellite_count=satellite_count,
+                         active_satellites=active_satellites)
 
 @app.route('/api/satellites')
 def get_satellites():
-    satellites = load_satellites()
-    # All satellites visible to all users
-    return jsonify(satellites)
+    version, satellites = satellite_registry.versioned()
+    
+    def build():
+        # All satellites visible to all users; image_url carries the image fingerprint
+        listed = [dict(s, image_url=url_for('static', filename=f"images/{s['image']}")) if s.get('image') else s
+                  for s in satellites]
+        return json.dumps(listed).encode()
+    
+    return response_cache.get('satellites', version, build).response()
 
 @app.route('/satellite/<int:satellite_id>')
 def satellite_detail(satellite_id):
-    satellites = load_satellites()
-    satellite = next((s for s in satellites if s['id'] == satellite_id), None)
+    satellite = satellite_registry.get(satellite_id)
     if not satellite:
         flash('Satellite not found', 'error')
         return redirect(url_for('dashboard'))
@@ -258,7 +299,205 @@ def satellite_detail(satellite_id):
 @app.route('/api/telemetry')
 def get_telemetry():
     with telemetry_lock:
-        return jsonify(telemetry_data)
+        etag = f"{telemetry_epoch}-{telemetry_version}"
+        matched = matching_etag(etag)
+        if matched:
+            return not_modified(matched)
+        snapshot = {str(sid): dict(data) for sid, data in telemetry_data.items()}
+    response = jsonify(snapshot)
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/telemetry/<int:satellite_id>')
+def get_satellite_telemetry(satellite_id):
+    with telemetry_lock:
+        if satellite_id not in telemetry_data:
+            return jsonify({'status': 'error', 'message': 'No telemetry for satellite'}), 404
+        # Warm-loaded satellites have no version until their next frame
+        etag = f"{telemetry_epoch}-{satellite_id}-{telemetry_versions.get(satellite_id, 0)}"
+        matched = matching_etag(etag)
+        if matched:
+            return not_modified(matched)
+        snapshot = dict(telemetry_data[satellite_id])
+    response = jsonify(snapshot)
+    response.set_etag(etag)
+    return response
+
+def service_unavailable(e):
+    return jsonify({'status': 'error', 'message': f'Telemetry service unavailable: {e}'}), 503
+
+@app.route('/api/telemetry/stats')
+def get_telemetry_stats():
+    try:
+        return jsonify(current_ingestion_stats()['parser'])
+    except OSError as e:
+        return service_unavailable(e)
+
+@app.route('/api/telemetry/sources')
+def get_telemetry_sources():
+    try:
+        return jsonify(current_ingestion_stats()['sources'])
+    except OSError as e:
+        return service_unavailable(e)
+
+@app.route('/api/telemetry/stream')
+def stream_telemetry():
+    # Optional filter: /api/telemetry/stream?ids=1,3
+    ids = request.args.get('ids')
+    satellite_ids = None
+    if ids:
+        try:
+            satellite_ids = {int(i) for i in ids.split(',') if i}
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'ids must be integers'}), 400
+    
+    # New clients get the current state first. Frames are published under
+    # telemetry_lock, so subscribing under it misses and repeats nothing.
+    with telemetry_lock:
+        subscriber = telemetry_broadcaster.subscribe(satellite_ids)
+        snapshot = [dict(data) for satellite_id, data in telemetry_data.items()
+                    if subscriber.wants(satellite_id)]
+    initial = ''.join(f"event: telemetry\ndata: {json.dumps(data)}\n\n" for data in snapshot)
+    
+    return Response(telemetry_broadcaster.stream(subscriber, initial=initial),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def finite_arg(name, default=None):
+    """Float query argument; ValueError unless it is a finite number"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        value = math.nan
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+def bad_request(e):
+    return jsonify({'status': 'error', 'message': str(e)}), 400
+
+@app.route('/api/telemetry/<int:satellite_id>/history')
+def get_telemetry_history(satellite_id):
+    # from/to are unix timestamps, step is the bucket width in seconds
+    try:
+        start_time = finite_arg('from')
+        end_time = finite_arg('to')
+        step = finite_arg('step')
+    except ValueError as e:
+        return bad_request(e)
+    if step is not None and step <= 0:
+        return jsonify({'status': 'error', 'message': 'step must be positive'}), 400
+    
+    history = telemetry_history.query(satellite_id, start_time, end_time, step)
+    if history is None:
+        return jsonify({'status': 'error', 'message': 'No telemetry for satellite'}), 404
+    history['satellite_id'] = satellite_id
+    return jsonify(history)
+
+@app.route('/api/telemetry/<int:satellite_id>/rollup')
+def get_telemetry_rollup(satellite_id):
+    """Rollup buckets for one satellite.
+
+    from/to are unix timestamps (default: the last hour). step is in seconds;
+    buckets come from the 1 s tier (last hour), 1 min tier (two days) or
+    1 h tier (90 days), the finest one step is a multiple of. A step that is
+    not a multiple of 60 is a 400 for ranges starting over an hour ago.
+    Without a step the finest tier answering in MAX_POINTS buckets is used.
+    """
+    try:
+        start_time = finite_arg('from')
+        end_time = finite_arg('to')
+    except ValueError as e:
+        return bad_request(e)
+    step = request.args.get('step', type=int)
+    if step is not None and step <= 0:
+        return jsonify({'status': 'error', 'message': 'step must be a positive number of seconds'}), 400
+    
+    try:
+        rollup = telemetry_rollups.query(satellite_id, start_time, end_time, step)
+    except ValueError as e:
+        return bad_request(e)
+    if rollup is None:
+        return jsonify({'status': 'error', 'message': 'No telemetry for satellite'}), 404
+    rollup['satellite_id'] = satellite_id
+    return jsonify(rollup)
+
+@app.route('/api/telemetry/fleet')
+def get_fleet_rollup():
+    """Fleet-wide rollup; from/to/step as for /api/telemetry/<id>/rollup"""
+    try:
+        start_time = finite_arg('from')
+        end_time = finite_arg('to')
+        low_signal = finite_arg('low_signal', LOW_SIGNAL_DBM)
+    except ValueError as e:
+        return bad_request(e)
+    step = request.args.get('step', type=int)
+    if step is not None and step <= 0:
+        return jsonify({'status': 'error', 'message': 'step must be a positive number of seconds'}), 400
+    
+    try:
+        return jsonify(telemetry_rollups.fleet(start_time, end_time, step, low_signal))
+    except ValueError as e:
+        return bad_request(e)
+
+@app.route('/api/images')
+def get_images():
+    try:
+        return jsonify(image_store.list())
+    except OSError as e:
+        return service_unavailable(e)
+
+@app.route('/api/images/latest')
+@app.route('/api/images/<int:image_id>')
+def get_image(image_id=None):
+    try:
+        image = image_store.get(image_id)
+    except OSError as e:
+        return service_unavailable(e)
+    if image is None:
+        return jsonify({'status': 'error', 'message': 'Image not found'}), 404
+    return Response(image['data'], mimetype='image/jpeg')
+
+@app.route('/metrics')
+def get_metrics():
+    text = metrics.render()
+    if telemetry_client is not None:
+        try:
+            text += telemetry_client.request('metrics')['text']
+        except OSError as e:
+            print(f"Telemetry service metrics unavailable: {e}")
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiler', methods=['GET', 'POST'])
+@admin_required
+def admin_profiler():
+    # POST {"enabled": true, "interval": 0.005} starts sampling, {"enabled": false} stops it.
+    # GET returns the hottest functions, or ?format=folded for flame graph tools.
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'status': 'error', 'message': 'expected a JSON object'}), 400
+        if data.get('enabled'):
+            interval = data.get('interval')
+            if interval is not None:
+                try:
+                    interval = float(interval)
+                except (TypeError, ValueError):
+                    interval = None
+                # NaN fails the comparison too
+                if interval is None or not 0.001 <= interval <= 1.0:
+                    return jsonify({'status': 'error', 'message': 'interval must be a number between 0.001 and 1 s'}), 400
+            profiler.start(interval)
+        else:
+            profiler.stop()
+        return jsonify(profiler.summary())
+    
+    if request.args.get('format') == 'folded':
+        return Response(profiler.folded(), mimetype='text/plain')
+    return jsonify(profiler.summary())
 
 @app.route('/analytics')
 def analytics():
@@ -274,42 +513,97 @@ def configure_satellite():
         rotation_y = data.get('rotation_y')
         rotation_z = data.get('rotation_z')
         
-        # Here you would send the configuration commands to the Arduino
-        # For now, we'll just log it
         print(f"Configuring satellite {satellite_id}: X={rotation_x}, Y={rotation_y}, Z={rotation_z}")
         
-        # Send command to Arduino if connected
+        # Queued for the uplink; poll /api/commands/<command_id> for the satellite's ACK
         command = f"CONFIG:{satellite_id}:X{rotation_x}:Y{rotation_y}:Z{rotation_z}"
-        # You can add serial communication here if needed
+        queued = command_queue.submit(command, satellite_id, data.get('priority', 'high'))
         
-        return jsonify({'status': 'success', 'message': 'Configuration applied successfully'})
+        return jsonify({'status': 'success', 'message': 'Configuration queued', 'command': queued})
+    except OSError as e:
+        return service_unavailable(e)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
 
+@app.route('/api/commands', methods=['GET', 'POST'])
+@admin_required
+def uplink_commands():
+    try:
+        if request.method == 'GET':
+            return jsonify(command_queue.list())
+        # {"command": "TAKE_PHOTO", "satellite_id": 1, "priority": "high|normal|low"}
+        data = request.get_json() or {}
+        if not data.get('command'):
+            return jsonify({'status': 'error', 'message': 'command is required'}), 400
+        try:
+            queued = command_queue.submit(data['command'], data.get('satellite_id', 0),
+                                          data.get('priority', 'normal'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        return jsonify(queued), 202
+    except OSError as e:
+        return service_unavailable(e)
+
+@app.route('/api/commands/<int:command_id>')
+@admin_required
+def uplink_command(command_id):
+    try:
+        command = command_queue.get(command_id)
+    except OSError as e:
+        return service_unavailable(e)
+    if command is None:
+        return jsonify({'status': 'error', 'message': 'Command not found'}), 404
+    return jsonify(command)
+
 @app.route('/admin/satellites', methods=['GET', 'POST'])
 @admin_required
 def admin_satellites():
     if request.method == 'POST':
         # Update satellite data
-        satellites = load_satellites()
         data = request.get_json()
-        for sat in satellites:
-            if sat['id'] == data.get('id'):
-                sat.update(data)
-                break
-        with open('satellites.json', 'w') as f:
-            json.dump(satellites, f, indent=2)
+        satellite_registry.update(data)
+        # The new file mtime changes the version too; this only frees the stale body early
+        response_cache.invalidate('satellites')
         return jsonify({'status': 'success'})
     
     satellites = load_satellites()
     return render_template('admin_satellites.html', satellites=satellites)
 
-if __name__ == '__main__':
+def create_app(service_address=None):
+    """Start the background services and return the app.
+
+    Used as the WSGI entry point, e.g. gunicorn -w 4 'app:create_app()'.
+    With a telemetry service address (argument or TELEMETRY_SERVICE) the
+    worker only follows that service; without one it reads the receivers
+    itself, which is only safe with a single worker process.
+    """
+    global telemetry_client, image_store, command_queue
+    if app.config.get('TELEMETRY_STARTED'):
+        return app
+    app.config['TELEMETRY_STARTED'] = True
+    
     # Ensure the static folder exists for serving static files
     os.makedirs('static', exist_ok=True)
+    static_assets.load()
     
-    # Start telemetry reading thread
-    telemetry_thread = threading.Thread(target=read_telemetry, daemon=True)
-    telemetry_thread.start()
+    # Restore recent telemetry from the database (read-only in every worker)
+    warm_load_telemetry()
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    address = service_address or TELEMETRY_SERVICE
+    if address:
+        telemetry_client = TelemetryServiceClient(address)
+        image_store = RemoteImages(telemetry_client)
+        command_queue = RemoteCommands(telemetry_client)
+        telemetry_client.follow(apply_service_snapshot, apply_service_frames)
+    else:
+        # This process owns the receivers and the database writer
+        telemetry_store.start()
+        command_queue.start()
+        telemetry_thread = threading.Thread(target=read_telemetry, daemon=True)
+        telemetry_thread.start()
+    return app
+
+if __name__ == '__main__':
+    create_app()
+    # The reloader would run a second copy of the receivers in its parent process
+    app.run(debug=True, use_reloader=False, threaded=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,192 @@
+import heapq
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# Uplink command line: CMD:<command_id>:<satellite_id>:<body>
+# (satellite_id 0 addresses every satellite). The satellite answers with
+# CMD_ACK:<command_id> once executed or CMD_NAK:<command_id>:<reason>.
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class UplinkCommand:
+    def __init__(self, command_id, body, satellite_id, priority):
+        self.command_id = command_id
+        self.body = body
+        self.satellite_id = satellite_id
+        self.priority = priority
+        self.state = 'queued'
+        self.attempts = 0
+        self.created = time.time()
+        self.sent_at = None
+        self.completed_at = None
+        self.error = None
+
+    def line(self):
+        return f"CMD:{self.command_id}:{self.satellite_id}:{self.body}\n".encode()
+
+    def as_dict(self):
+        return {
+            'command_id': self.command_id,
+            'command': self.body,
+            'satellite_id': self.satellite_id,
+            'priority': self.priority,
+            'state': self.state,
+            'attempts': self.attempts,
+            'created': self.created,
+            'sent_at': self.sent_at,
+            'completed_at': self.completed_at,
+            'error': self.error,
+        }
+
+
+class CommandQueue:
+    """Uplink commands with priorities, acknowledgements and retries.
+
+    Commands go out highest priority first (in submission order within a
+    priority) with up to `window` of them awaiting acknowledgement at once.
+    A command not acknowledged within ack_timeout is sent again, and marked
+    failed after max_attempts. The satellite de-duplicates by command id and
+    body, so a resend whose ACK was lost is not executed twice.
+
+    send(line) writes one uplink line and returns False when no link is up;
+    the command then stays queued.
+    """
+
+    def __init__(self, send, window=4, ack_timeout=15.0, max_attempts=3, keep=200):
+        self.send = send
+        self.window = window
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self.keep = keep
+        # Random per run (below 2**53 so JavaScript reads ids exactly): a
+        # restarted queue doesn't reuse ids the satellite still remembers
+        self.next_id = random.SystemRandom().randrange(1 << 48)
+        self.commands = OrderedDict()
+        self.queue = []
+        self.in_flight = {}
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopping = False
+
+    def submit(self, body, satellite_id=0, priority='normal'):
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+        if '\n' in body or '\r' in body:
+            raise ValueError("command must be a single line")
+        with self.condition:
+            self.next_id += 1
+            command = UplinkCommand(self.next_id, body, int(satellite_id), priority)
+            self.commands[command.command_id] = command
+            heapq.heappush(self.queue, (PRIORITIES[priority], command.command_id))
+            self._trim()
+            self.condition.notify()
+            return command.as_dict()
+
+    def _trim(self):
+        # Forget the oldest finished commands
+        excess = len(self.commands) - self.keep
+        for command_id in list(self.commands):
+            if excess <= 0:
+                break
+            if self.commands[command_id].state in ('acked', 'failed'):
+                del self.commands[command_id]
+                excess -= 1
+
+    def acknowledge(self, line):
+        """Handle a CMD_ACK / CMD_NAK line from the downlink"""
+        kind, _, rest = line.strip().partition(':')
+        command_id, _, reason = rest.partition(':')
+        try:
+            command_id = int(command_id)
+        except ValueError:
+            print(f"Bad command acknowledgement: {line!r}")
+            return
+        with self.condition:
+            command = self.commands.get(command_id)
+            if command is None or command.state in ('acked', 'failed'):
+                return
+            self.in_flight.pop(command_id, None)
+            command.completed_at = time.time()
+            if kind == 'CMD_ACK':
+                command.state = 'acked'
+            else:
+                command.state = 'failed'
+                command.error = reason or 'rejected'
+            self.condition.notify()
+        print(f"Command {command_id} {command.state}" + (f": {command.error}" if command.error else ""))
+
+    def get(self, command_id):
+        with self.condition:
+            command = self.commands.get(command_id)
+            return command.as_dict() if command else None
+
+    def list(self):
+        with self.condition:
+            return [command.as_dict() for command in reversed(self.commands.values())]
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True, name='command-queue')
+            self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _expire(self, now):
+        """Requeue or fail timed out commands; return seconds until the next deadline"""
+        wait = None
+        for command_id, deadline in list(self.in_flight.items()):
+            if now < deadline:
+                wait = deadline - now if wait is None else min(wait, deadline - now)
+                continue
+            del self.in_flight[command_id]
+            command = self.commands.get(command_id)
+            if command is None:
+                continue
+            if command.attempts >= self.max_attempts:
+                command.state = 'failed'
+                command.error = 'no acknowledgement'
+                command.completed_at = time.time()
+                print(f"Command {command_id} failed: no acknowledgement after {command.attempts} attempts")
+            else:
+                command.state = 'queued'
+                heapq.heappush(self.queue, (PRIORITIES[command.priority], command_id))
+        return wait
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.stopping:
+                        return
+                    wait = self._expire(time.monotonic())
+                    if self.queue and len(self.in_flight) < self.window:
+                        break
+                    self.condition.wait(wait)
+                _, command_id = heapq.heappop(self.queue)
+                command = self.commands.get(command_id)
+                if command is None or command.state != 'queued':
+                    continue
+                line = command.line()
+
+            # Write outside the lock; the serial write may block for a while
+            sent = self.send(line)
+
+            with self.condition:
+                if command.state != 'queued':
+                    continue
+                if not sent:
+                    heapq.heappush(self.queue, (PRIORITIES[command.priority], command_id))
+                    # No receiver connected; try again shortly
+                    self.condition.wait(1.0)
+                    continue
+                command.state = 'sent'
+                command.attempts += 1
+                command.sent_at = time.time()
+                self.in_flight[command_id] = time.monotonic() + self.ack_timeout
@@ -0,0 +1,223 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import current_app, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    # gzip only; pip install brotli to also serve br
+    brotli = None
+
+# Images and fonts are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 500
+# Fingerprinted static URLs change whenever the file does, so they never go stale
+IMMUTABLE_MAX_AGE = 365 * 86400
+STATIC_MAX_AGE = 300
+# Compression levels: responses built per request favour speed, cached ones size
+FAST_LEVELS = {'br': 4, 'gzip': 6}
+BEST_LEVELS = {'br': 11, 'gzip': 9}
+# Each encoding gets its own strong ETag, so caches never swap one variant for another
+ETAG_SUFFIXES = {'br': 'br', 'gzip': 'gz'}
+
+
+def compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(encodings=('br', 'gzip')):
+    """Best content encoding the client accepts, or None for identity"""
+    for encoding in encodings:
+        if encoding == 'br' and brotli is None:
+            continue
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(data, encoding, levels=FAST_LEVELS):
+    if encoding == 'br':
+        return brotli.compress(data, quality=levels['br'])
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, compresslevel=levels['gzip'], mtime=0)
+
+
+def encoded_etag(etag, encoding):
+    """ETag of the variant of a body sent with encoding (None for identity)"""
+    return f"{etag}-{ETAG_SUFFIXES[encoding]}" if encoding else etag
+
+
+def matching_etag(etag):
+    """The variant of etag the request's If-None-Match holds, or None"""
+    for encoding in (None,) + tuple(ETAG_SUFFIXES):
+        candidate = encoded_etag(etag, encoding)
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def compress_response(response):
+    """after_request hook: compress JSON and text responses the client accepts compressed"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or not compressible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
+
+
+class EncodedBody:
+    """A serialized response body and its compressed variants.
+
+    Variants are built on first use (or all at once by precompress()) and
+    kept, so serving a cached body never compresses it again.
+    """
+
+    def __init__(self, data, mimetype, etag, levels=FAST_LEVELS):
+        self.mimetype = mimetype
+        self.etag = etag
+        self.levels = levels
+        self.variants = {None: data}
+
+    def variant(self, encoding):
+        data = self.variants.get(encoding)
+        if data is None:
+            # Two threads may build the same variant; both results are identical
+            data = self.variants[encoding] = compress(self.variants[None], encoding, self.levels)
+        return data
+
+    def precompress(self):
+        for encoding in ('br', 'gzip'):
+            if encoding != 'br' or brotli is not None:
+                self.variant(encoding)
+
+    def response(self):
+        data = self.variants[None]
+        encoding = None
+        if compressible(self.mimetype) and len(data) >= MIN_COMPRESS_SIZE:
+            encoding = choose_encoding()
+        response = current_app.response_class(self.variant(encoding), mimetype=self.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(encoded_etag(self.etag, encoding))
+        return response.make_conditional(request)
+
+
+class ResponseCache:
+    """Serialized API responses keyed by name and the version of their data.
+
+    get() rebuilds a body only when the version differs from the cached one,
+    so a version derived from the underlying data (e.g. the satellite file's
+    mtime) invalidates the entry in every worker without any messaging.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, version, build, mimetype='application/json'):
+        """Cached EncodedBody for key at version; build() returns the body bytes"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+        body = EncodedBody(build(), mimetype, f"{key}-{version}")
+        with self.lock:
+            self.entries[key] = (version, body)
+        return body
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+class StaticAssets:
+    """Fingerprinted, pre-compressed static files.
+
+    url_for('static', filename=...) gets a ?v=<content hash> argument, and
+    requests carrying the current hash are served with a year-long immutable
+    Cache-Control. Text assets are compressed once, at best ratio, when first
+    seen or changed on disk; other files go through send_static_file().
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        # filename -> (mtime_ns, size, fingerprint, EncodedBody or None)
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def _entry(self, filename):
+        path = safe_join(self.folder, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = self.files.get(filename)
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry
+        with open(path, 'rb') as f:
+            data = f.read()
+        fingerprint = hashlib.md5(data).hexdigest()[:12]
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        body = None
+        if compressible(mimetype) and len(data) >= MIN_COMPRESS_SIZE:
+            body = EncodedBody(data, mimetype, fingerprint, levels=BEST_LEVELS)
+            body.precompress()
+        entry = (stat.st_mtime_ns, stat.st_size, fingerprint, body)
+        with self.lock:
+            self.files[filename] = entry
+        return entry
+
+    def load(self):
+        """Fingerprint and compress every file up front"""
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                self._entry(os.path.relpath(os.path.join(root, name), self.folder).replace(os.sep, '/'))
+        print(f"Prepared {len(self.files)} static files from {self.folder}")
+
+    def url_defaults(self, endpoint, values):
+        """app.url_defaults hook adding the fingerprint to static URLs"""
+        if endpoint != 'static' or 'v' in values or 'filename' not in values:
+            return
+        entry = self._entry(values['filename'])
+        if entry is not None:
+            values['v'] = entry[2]
+
+    def serve(self, filename):
+        """Replacement view for the 'static' endpoint"""
+        entry = self._entry(filename)
+        if entry is not None and entry[3] is not None:
+            response = entry[3].response()
+        else:
+            response = current_app.send_static_file(filename)
+        # send_static_file() marks responses no-cache when the app sets no max age
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        if entry is not None and request.args.get('v') == entry[2]:
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.max_age = STATIC_MAX_AGE
+        return response
@@ -0,0 +1,178 @@
+import struct
+import threading
+import time
+from binascii import crc_hqx
+from collections import OrderedDict
+
+# Binary image downlink frame (little endian), mirrored in
+# sputnik-frimware/raspberry-src/downlink.py:
+#   0xA5 0x5A        sync
+#   uint8  type      IMAGE_START / IMAGE_CHUNK / IMAGE_END
+#   uint16 image_id
+#   uint16 seq       chunk number (0 for START/END)
+#   uint16 total     number of chunks in the image
+#   uint8  length    payload length
+#   payload          START: uint32 image size; CHUNK: JPEG bytes; END: empty
+#   uint16 crc       CRC-16/CCITT (init 0xFFFF) over type..payload
+IMAGE_SYNC = b'\xa5\x5a'
+IMAGE_HEADER = struct.Struct('<BHHHB')
+IMAGE_HEADER_SIZE = len(IMAGE_SYNC) + IMAGE_HEADER.size
+IMAGE_START = 1
+IMAGE_CHUNK = 2
+IMAGE_END = 3
+
+# Missing chunks listed per IMG_NACK uplink line
+NACK_BATCH = 32
+# Partial images are dropped after this many unanswered NACK rounds
+MAX_NACKS = 5
+
+
+class MalformedImageFrame(ValueError):
+    pass
+
+
+def image_frame_size(header):
+    """Total frame size given at least IMAGE_HEADER_SIZE bytes of it"""
+    return IMAGE_HEADER_SIZE + header[IMAGE_HEADER_SIZE - 1] + 2
+
+
+def decode_image_frame(frame):
+    """Return (type, image_id, seq, total, payload) or raise MalformedImageFrame"""
+    body = frame[len(IMAGE_SYNC):-2]
+    crc, = struct.unpack_from('<H', frame, len(frame) - 2)
+    if crc_hqx(body, 0xFFFF) != crc:
+        raise MalformedImageFrame("checksum mismatch")
+    frame_type, image_id, seq, total, length = IMAGE_HEADER.unpack_from(body)
+    if frame_type not in (IMAGE_START, IMAGE_CHUNK, IMAGE_END):
+        raise MalformedImageFrame(f"unknown frame type {frame_type}")
+    return frame_type, image_id, seq, total, bytes(body[IMAGE_HEADER.size:])
+
+
+def encode_image_frame(frame_type, image_id, seq, total, payload=b''):
+    body = IMAGE_HEADER.pack(frame_type, image_id, seq, total, len(payload)) + payload
+    return IMAGE_SYNC + body + struct.pack('<H', crc_hqx(body, 0xFFFF))
+
+
+class PartialImage:
+    def __init__(self, image_id, total, source):
+        self.image_id = image_id
+        self.total = total
+        self.size = None
+        self.chunks = {}
+        self.source = source
+        self.ended = False
+        self.nacks = 0
+        self.updated = time.monotonic()
+
+    def missing(self):
+        return [seq for seq in range(self.total) if seq not in self.chunks]
+
+
+class ImageReassembler:
+    """Rebuilds JPEGs from downlink frames and asks for missing chunks.
+
+    handle() returns uplink lines to send back on the link the frame came
+    from: IMG_NACK:<id>:<seq>,<seq>,... for chunks still missing after
+    IMAGE_END (or after stall_timeout without progress), IMG_ACK:<id> once
+    the image is complete.
+    """
+
+    def __init__(self, keep=20, stall_timeout=10.0):
+        self.keep = keep
+        self.stall_timeout = stall_timeout
+        self.partial = {}
+        self.images = OrderedDict()
+        self.lock = threading.Lock()
+        self.retransmit_requests = 0
+
+    def _nack(self, image):
+        image.updated = time.monotonic()
+        image.nacks += 1
+        missing = image.missing()
+        self.retransmit_requests += 1
+        lines = []
+        for start in range(0, len(missing), NACK_BATCH):
+            seqs = ','.join(str(seq) for seq in missing[start:start + NACK_BATCH])
+            lines.append(f"IMG_NACK:{image.image_id}:{seqs}\n".encode())
+        return lines
+
+    def _complete(self, image):
+        data = b''.join(image.chunks[seq] for seq in range(image.total))
+        if image.size is not None:
+            data = data[:image.size]
+        del self.partial[image.image_id]
+        self.images[image.image_id] = {
+            'image_id': image.image_id,
+            'size': len(data),
+            'chunks': image.total,
+            'received': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'data': data,
+        }
+        self.images.move_to_end(image.image_id)
+        while len(self.images) > self.keep:
+            self.images.popitem(last=False)
+        print(f"Image {image.image_id} received: {len(data)} bytes")
+        return [f"IMG_ACK:{image.image_id}\n".encode()]
+
+    def handle(self, frame_type, image_id, seq, total, payload, source=None):
+        with self.lock:
+            done = self.images.get(image_id)
+            if done is not None and frame_type != IMAGE_START and done['chunks'] == total:
+                # Already complete; the sender missed our ACK
+                return [f"IMG_ACK:{image_id}\n".encode()]
+
+            image = self.partial.get(image_id)
+            if image is None or (frame_type == IMAGE_START and image.total != total):
+                image = self.partial[image_id] = PartialImage(image_id, total, source)
+                self.images.pop(image_id, None)
+            image.updated = time.monotonic()
+            image.nacks = 0
+            image.source = source
+
+            if frame_type == IMAGE_START:
+                if len(payload) == 4:
+                    image.size, = struct.unpack('<I', payload)
+            elif frame_type == IMAGE_CHUNK:
+                if seq < image.total:
+                    image.chunks[seq] = payload
+            elif frame_type == IMAGE_END:
+                image.ended = True
+
+            if len(image.chunks) == image.total:
+                return self._complete(image)
+            if frame_type == IMAGE_END:
+                return self._nack(image)
+            return []
+
+    def stalled(self, source=None):
+        """NACK lines for images from source with no progress for stall_timeout"""
+        now = time.monotonic()
+        lines = []
+        with self.lock:
+            for image in list(self.partial.values()):
+                if source is not None and image.source != source:
+                    continue
+                if now - image.updated < self.stall_timeout:
+                    continue
+                if image.nacks >= MAX_NACKS:
+                    print(f"Image {image.image_id} abandoned: {len(image.missing())} chunks missing")
+                    del self.partial[image.image_id]
+                    continue
+                lines.extend(self._nack(image))
+        return lines
+
+    def list(self):
+        with self.lock:
+            return [{k: v for k, v in info.items() if k != 'data'} for info in self.images.values()]
+
+    def get(self, image_id=None):
+        """Return a completed image's info dict (the latest if image_id is None)"""
+        with self.lock:
+            if image_id is None:
+                if not self.images:
+                    return None
+                return next(reversed(self.images.values()))
+            return self.images.get(image_id)
+
+
+image_reassembler = ImageReassembler()
@@ -0,0 +1,358 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+import serial
+
+from metrics import metrics
+from telemetry_parser import TelemetryDecoder, ParserStats, parser_stats
+
+# Receiver ports probed when no sources are configured
+SERIAL_PORTS = ['/dev/ttyUSB0', '/dev/ttyACM0', '/dev/tty.usbserial-1410', 'COM3']
+BAUD_RATE = 9600
+
+chunk_seconds = metrics.histogram('telemetry_chunk_process_seconds',
+                                  'Time to decode a received chunk and store its frames',
+                                  labels=('source',))
+
+
+class FrameDeduplicator:
+    """Drops frames already seen from another receiver within `window` seconds.
+
+    A frame repeated by the same receiver is a new reading that happens to
+    match the last one (e.g. a satellite sending unchanged values), so it is
+    kept.
+    """
+
+    def __init__(self, window=2.0):
+        self.window = window
+        # frame key -> (seen_at, receiver key)
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+
+    def filter(self, frames, source=None):
+        now = time.monotonic()
+        unique = []
+        with self.lock:
+            # Entries are kept in arrival order, so expired ones are at the front
+            while self.seen:
+                key, (seen_at, _) = next(iter(self.seen.items()))
+                if now - seen_at <= self.window:
+                    break
+                del self.seen[key]
+            for data in frames:
+                key = tuple(sorted(data.items()))
+                seen = self.seen.get(key)
+                if seen is not None and seen[1] != source:
+                    continue
+                self.seen[key] = (now, source)
+                self.seen.move_to_end(key)
+                unique.append(data)
+        return unique
+
+
+class TelemetrySource:
+    """One receiver connection read by its own thread.
+
+    Subclasses implement open(), read(conn) and close(conn); the base class
+    handles decoding, reconnection with backoff and counters.
+    """
+
+    kind = 'source'
+
+    def __init__(self, address):
+        self.address = address
+        self.name = f"{self.kind}:{address}"
+        self.stats = ParserStats(parent=parser_stats)
+        self.image_reassembler = None
+        self.command_handler = None
+        self.decoder = None
+        self.last_sender = None
+        self.bytes = 0
+        self.errors = 0
+        self.duplicates = 0
+        # Seconds of received data still waiting in the OS buffer
+        self.lag = 0.0
+        self.connected = False
+        self.conn = None
+        # Uplink lines come from this thread (image ACK/NACK) and from the command queue
+        self.write_lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def open(self):
+        raise NotImplementedError
+
+    def read(self, conn):
+        raise NotImplementedError
+
+    def close(self, conn):
+        conn.close()
+
+    def write(self, conn, sender, data):
+        """Send uplink bytes (image ACK/NACK lines) back to the receiver"""
+        conn.write(data)
+
+    def send(self, data, sender=None):
+        """Write uplink bytes from any thread; returns False when not connected"""
+        with self.write_lock:
+            conn = self.conn
+            if conn is None:
+                return False
+            self.write(conn, sender if sender is not None else self.last_sender, data)
+            return True
+
+    def make_decoder(self):
+        handler = None
+        if self.image_reassembler is not None:
+            reassembler = self.image_reassembler
+            name = self.name
+
+            def handler(*frame):
+                return reassembler.handle(*frame, source=name)
+        return TelemetryDecoder(self.stats, image_handler=handler, command_handler=self.command_handler)
+
+    def decoder_for(self, sender):
+        return self.decoder
+
+    def receiver_key(self, sender):
+        """Identifies the receiver a chunk came from, for de-duplication"""
+        return self.name
+
+    def send_replies(self, conn, sender, decoder):
+        replies = decoder.replies
+        decoder.replies = []
+        with self.write_lock:
+            for reply in replies:
+                self.write(conn, sender, reply)
+
+    def check_stalled_images(self, conn):
+        if self.image_reassembler is None:
+            return
+        lines = self.image_reassembler.stalled(self.name)
+        with self.write_lock:
+            for line in lines:
+                self.write(conn, self.last_sender, line)
+
+    def run(self, ingestor):
+        retry_delay = 1
+        while not self.stopping.is_set():
+            try:
+                conn = self.open()
+            except (OSError, serial.SerialException) as e:
+                self.errors += 1
+                print(f"Telemetry source {self.name} unavailable: {e}")
+                self.stopping.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
+                continue
+
+            print(f"Connected to telemetry source {self.name}")
+            self.connected = True
+            self.decoder = self.make_decoder()
+            with self.write_lock:
+                self.conn = conn
+            retry_delay = 1
+            last_stall_check = time.monotonic()
+            try:
+                while not self.stopping.is_set():
+                    if time.monotonic() - last_stall_check >= 1:
+                        self.check_stalled_images(conn)
+                        last_stall_check = time.monotonic()
+                    received = self.read(conn)
+                    if received is None:
+                        continue
+                    chunk, sender = received
+                    started = time.perf_counter()
+                    self.bytes += len(chunk)
+                    self.last_sender = sender
+                    decoder = self.decoder_for(sender)
+                    frames = decoder.feed(chunk)
+                    if decoder.replies:
+                        self.send_replies(conn, sender, decoder)
+                    if frames:
+                        ingestor.deliver(self, frames, sender)
+                    chunk_seconds.observe(time.perf_counter() - started, self.name)
+            except Exception as e:
+                self.errors += 1
+                print(f"Telemetry source {self.name} error: {e}. Reconnecting...")
+            finally:
+                self.connected = False
+                with self.write_lock:
+                    self.conn = None
+                try:
+                    self.close(conn)
+                except Exception:
+                    pass
+
+    def as_dict(self):
+        data = self.stats.as_dict()
+        data.update({
+            'name': self.name,
+            'connected': self.connected,
+            'bytes': self.bytes,
+            'errors': self.errors,
+            'duplicates': self.duplicates,
+            'lag': self.lag,
+        })
+        return data
+
+
+class SerialSource(TelemetrySource):
+    kind = 'serial'
+
+    def __init__(self, port, baud_rate=9600):
+        super().__init__(port)
+        self.baud_rate = baud_rate
+
+    def open(self):
+        return serial.Serial(self.address, self.baud_rate, timeout=1)
+
+    def read(self, conn):
+        # Blocks for the first byte (up to the timeout), then takes everything waiting
+        chunk = conn.read(conn.in_waiting or 1)
+        if not chunk:
+            self.lag = 0.0
+            return None
+        # Whatever arrived while we read is the backlog; 10 bits per byte on the wire
+        self.lag = conn.in_waiting * 10 / self.baud_rate
+        return chunk, None
+
+
+class TcpSource(TelemetrySource):
+    """Networked receiver that streams telemetry over a TCP connection"""
+
+    kind = 'tcp'
+
+    def open(self):
+        host, port = self.address.rsplit(':', 1)
+        conn = socket.create_connection((host, int(port)), timeout=5)
+        conn.settimeout(1)
+        return conn
+
+    def read(self, conn):
+        try:
+            chunk = conn.recv(4096)
+        except socket.timeout:
+            return None
+        if not chunk:
+            raise ConnectionError("connection closed by receiver")
+        return chunk, None
+
+    def write(self, conn, sender, data):
+        conn.sendall(data)
+
+
+class UdpSource(TelemetrySource):
+    """Listens for telemetry datagrams from any number of receivers"""
+
+    kind = 'udp'
+
+    def open(self):
+        host, port = self.address.rsplit(':', 1)
+        conn = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        conn.bind((host, int(port)))
+        conn.settimeout(1)
+        self.decoders = {}
+        return conn
+
+    def read(self, conn):
+        try:
+            chunk, sender = conn.recvfrom(65535)
+        except socket.timeout:
+            return None
+        return chunk, sender
+
+    def write(self, conn, sender, data):
+        if sender is not None:
+            conn.sendto(data, sender)
+
+    def receiver_key(self, sender):
+        # Every receiver sends to the same socket; tell them apart by address
+        if sender is None:
+            return self.name
+        return f"{self.name}:{sender[0]}:{sender[1]}"
+
+    def decoder_for(self, sender):
+        # Keep partial frames from different senders apart
+        decoder = self.decoders.get(sender)
+        if decoder is None:
+            decoder = self.decoders[sender] = self.make_decoder()
+        return decoder
+
+
+SOURCE_TYPES = {
+    'serial': SerialSource,
+    'tcp': TcpSource,
+    'udp': UdpSource,
+}
+
+
+def parse_source_spec(spec):
+    """Build sources from e.g. "serial:/dev/ttyUSB0,tcp:10.0.0.5:4000,udp:0.0.0.0:5005" """
+    sources = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        kind, sep, address = item.partition(':')
+        if not sep or kind not in SOURCE_TYPES:
+            raise ValueError(f"Unknown telemetry source: {item}")
+        sources.append(SOURCE_TYPES[kind](address))
+    return sources
+
+
+def detect_serial_sources(ports=SERIAL_PORTS, baud_rate=BAUD_RATE):
+    """Return a SerialSource for every receiver port that opens"""
+    sources = []
+    for port in ports:
+        try:
+            serial.Serial(port, baud_rate, timeout=1).close()
+        except serial.SerialException:
+            continue
+        sources.append(SerialSource(port, baud_rate))
+    return sources
+
+
+class TelemetryIngestor:
+    """Runs every source concurrently and merges their frames into one sink"""
+
+    def __init__(self, sources, sink, dedup_window=2.0, image_reassembler=None, command_handler=None):
+        self.sources = sources
+        self.sink = sink
+        self.deduplicator = FrameDeduplicator(dedup_window)
+        for source in sources:
+            source.image_reassembler = image_reassembler
+            source.command_handler = command_handler
+
+    def deliver(self, source, frames, sender=None):
+        unique = self.deduplicator.filter(frames, source.receiver_key(sender))
+        source.duplicates += len(frames) - len(unique)
+        if unique:
+            self.sink(unique)
+
+    def send_uplink(self, data):
+        """Send an uplink line through the first connected receiver"""
+        for source in self.sources:
+            try:
+                if source.send(data):
+                    return True
+            except Exception as e:
+                print(f"Uplink through {source.name} failed: {e}")
+        return False
+
+    def start(self):
+        for source in self.sources:
+            source.thread = threading.Thread(target=source.run, args=(self,), daemon=True,
+                                             name=f"telemetry-{source.name}")
+            source.thread.start()
+
+    def stop(self):
+        for source in self.sources:
+            source.stopping.set()
+        for source in self.sources:
+            if source.thread is not None:
+                source.thread.join()
+
+    def stats(self):
+        return [source.as_dict() for source in self.sources]
@@ -0,0 +1,255 @@
+import bisect
+import collections
+import sys
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond lock waits to slow requests
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = collections.defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] += amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in items]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(entry)) for key, entry in self.values.items()]
+        samples = []
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labels, key, ('le', _format_value(float(bound))))
+                samples.append((self.name + '_bucket', labels, cumulative))
+            labels = _format_labels(self.labels, key)
+            samples.append((self.name + '_sum', labels, entry[-1]))
+            samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Counters and histograms rendered in the Prometheus text format.
+
+    Values owned by other components (parser counts, queue sizes) are read at
+    scrape time through collectors: callables returning
+    (name, type, help, [(labels dict, value), ...]) tuples.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            samples = metric.samples()
+            if not samples:
+                # Unused here (e.g. receiver metrics in a worker that follows the ingestion service)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    rendered = _format_labels(names, tuple(labels[n] for n in names))
+                    lines.append(f"{name}{rendered} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+class TimedLock:
+    """threading.Lock that records how long callers wait to acquire it"""
+
+    def __init__(self, histogram, name):
+        self.lock = threading.Lock()
+        self.histogram = histogram
+        self.name = name
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self.lock.acquire(False):
+            self.histogram.observe(0.0, self.name)
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self.lock.acquire(True, timeout)
+        self.histogram.observe(time.perf_counter() - start, self.name)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SamplingProfiler:
+    """Low-overhead statistical profiler over every Python thread.
+
+    While running, a background thread snapshots all thread stacks every
+    `interval` seconds and counts them, so hot spots show up in proportion to
+    the time spent in them. Stacks are kept in the folded format used by
+    flame graph tools.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self, interval=None):
+        with self.lock:
+            if self.thread is not None:
+                return
+            if interval:
+                self.interval = interval
+            self.stacks.clear()
+            self.samples = 0
+            self.started = time.time()
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True, name='sampling-profiler')
+            self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            thread = self.thread
+            self.thread = None
+        if thread is not None:
+            self.stopping.set()
+            thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ';'.join(reversed(stack))
+                with self.lock:
+                    self.stacks[key] += 1
+            with self.lock:
+                self.samples += 1
+
+    def folded(self):
+        """Stacks as 'thread;outer;...;inner count' lines"""
+        with self.lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top=20):
+        """Sample counts of the innermost frames, hottest first"""
+        leaves = collections.Counter()
+        with self.lock:
+            for stack, count in self.stacks.items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+            samples = self.samples
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'started': self.started,
+            'samples': samples,
+            'top': [{'function': name, 'samples': count} for name, count in leaves.most_common(top)],
+        }
+
+
+metrics = MetricsRegistry()
+profiler = SamplingProfiler()
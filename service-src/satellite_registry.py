@@ -0,0 +1,173 @@
+import os
+import json
+import copy
+import tempfile
+import threading
+
+# Default data used when satellites.json doesn't exist or is invalid
+DEFAULT_SATELLITES = [
+    {
+        'id': 1,
+        'name': 'SITeye-1',
+        'status': 'Active',
+        'launch_date': '2026-01-27',
+        'mission': 'Сеть дистанционного зондирования Земли',
+        'altitude': '520 km',
+        'last_contact': '2026-01-27 14:30:22',
+        'description': 'Спутник дистанционного зондирования формата 1U',
+        'image': '1.png',
+        'owner': 'admin'
+    },
+    {
+        'id': 2,
+        'name': 'SITeye-2',
+        'status': 'Active',
+        'launch_date': '2026-01-27',
+        'mission': 'Сеть дистанционного зондирования Земли',
+        'altitude': '540 km',
+        'last_contact': '2026-01-27 15:45:10',
+        'description': 'Спутник дистанционного зондирования формата 1U',
+        'image': '2.png',
+        'owner': 'admin'
+    },
+    {
+        'id': 3,
+        'name': 'SITeye-3',
+        'status': 'Maintenance',
+        'launch_date': '2026-01-27',
+        'mission': 'Сеть дистанционного зондирования Земли',
+        'altitude': '510 km',
+        'last_contact': '2026-01-25 09:20:15',
+        'description': 'Спутник дистанционного зондирования формата 1U',
+        'image': '3.png',
+        'owner': 'user'
+    },
+    {
+        'id': 4,
+        'name': 'SITeye-4',
+        'status': 'Active',
+        'launch_date': '2026-01-27',
+        'mission': 'Сеть дистанционного зондирования Земли',
+        'altitude': '530 km',
+        'last_contact': '2026-01-27 16:10:45',
+        'description': 'Спутник дистанционного зондирования формата 1U',
+        'image': '4.png',
+        'owner': 'admin'
+    },
+    {
+        'id': 5,
+        'name': 'SITeye-5',
+        'status': 'Inactive',
+        'launch_date': '2026-01-27',
+        'mission': 'Сеть дистанционного зондирования Земли',
+        'altitude': '480 km',
+        'last_contact': '2026-01-20 22:10:33',
+        'description': 'Спутник дистанционного зондирования формата 1U',
+        'image': '5.png',
+        'owner': 'user'
+    },
+    {
+        'id': 6,
+        'name': 'SITeye-6',
+        'status': 'Active',
+        'launch_date': '2026-01-27',
+        'mission': 'Сеть дистанционного зондирования Земли',
+        'altitude': '510 km',
+        'last_contact': '2026-01-27 10:05:17',
+        'description': 'Спутник дистанционного зондирования формата 1U',
+        'image': '6.png',
+        'owner': 'admin'
+    }
+]
+
+
+class SatelliteRegistry:
+    """In-memory satellite list backed by a JSON file.
+
+    The file is parsed once and re-read only when its mtime changes, so
+    request handlers can call all()/get() without touching the disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.satellites = []
+        self.by_id = {}
+        self.count = 0
+        self.active_count = 0
+        self.mtime = None
+
+    def _index(self, satellites):
+        self.satellites = satellites
+        self.by_id = {s['id']: s for s in satellites}
+        self.count = len(satellites)
+        self.active_count = sum(1 for s in satellites if s.get('status') == 'Active')
+
+    def _write(self, satellites):
+        # Write to a temp file in the same directory, then rename over the
+        # original so readers never see a half-written file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.satellites-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(satellites, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.mtime = os.stat(self.path).st_mtime_ns
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime is not None and mtime == self.mtime:
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                satellites = json.load(f)
+            self.mtime = mtime
+        except (FileNotFoundError, json.JSONDecodeError):
+            satellites = copy.deepcopy(DEFAULT_SATELLITES)
+            self._write(satellites)
+        self._index(satellites)
+
+    def all(self):
+        with self.lock:
+            self._refresh()
+            return self.satellites
+
+    def get(self, satellite_id):
+        with self.lock:
+            self._refresh()
+            return self.by_id.get(satellite_id)
+
+    def versioned(self):
+        """Return (version, satellites); the version changes whenever the file does"""
+        with self.lock:
+            self._refresh()
+            return self.mtime, self.satellites
+
+    def stats(self):
+        """Return (count, active_count) without rescanning the list"""
+        with self.lock:
+            self._refresh()
+            return self.count, self.active_count
+
+    def update(self, data):
+        """Merge data into the satellite with matching id and persist"""
+        with self.lock:
+            self._refresh()
+            satellites = copy.deepcopy(self.satellites)
+            for sat in satellites:
+                if sat['id'] == data.get('id'):
+                    sat.update(data)
+                    break
+            self._write(satellites)
+            self._index(satellites)
@@ -49,7 +49,7 @@ function createSatelliteCard(satellite) {
             <h3 class="satellite-name">${satellite.name}</h3>
             <span class="satellite-status ${statusClass}">${satellite.status}</span>
         </div>
-        <img src="/static/images/${satellite.image}" alt="${satellite.name}" class="satellite-image">
+        <img src="${satellite.image_url || `/static/images/${satellite.image}`}" alt="${satellite.name}" class="satellite-image">
         <div class="satellite-info">
             <div class="info-item">
                 <span class="info-label">Орбита:</span>
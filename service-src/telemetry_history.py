@@ -0,0 +1,124 @@
+import math
+import threading
+from array import array
+
+# Numeric telemetry fields kept in history, in column order
+HISTORY_FIELDS = ('temperature', 'battery', 'signal_strength', 'altitude', 'speed')
+
+
+class TelemetryRingBuffer:
+    """Fixed-size, array-backed history of samples for one satellite.
+
+    Each field is stored in its own preallocated array('d') column; once the
+    buffer is full the oldest sample is overwritten. Missing values are NaN.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.columns = {field: array('d', bytes(8 * capacity)) for field in HISTORY_FIELDS}
+        self.start = 0
+        self.size = 0
+
+    def append(self, timestamp, data):
+        if self.size < self.capacity:
+            pos = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            pos = self.start
+            self.start = (self.start + 1) % self.capacity
+
+        self.timestamps[pos] = timestamp
+        for field, column in self.columns.items():
+            value = data.get(field)
+            column[pos] = math.nan if value is None else value
+
+    def _pos(self, i):
+        return (self.start + i) % self.capacity
+
+    def _lower_bound(self, timestamp):
+        # Samples are appended in time order, so binary search works on the
+        # logical (oldest-first) index
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[self._pos(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, start_time=None, end_time=None, step=None):
+        """Return {'timestamp': [...], <field>: [...]} for the time range.
+
+        With step (seconds) samples are averaged into buckets of that width.
+        """
+        first = 0 if start_time is None else self._lower_bound(start_time)
+        last = self.size if end_time is None else self._lower_bound(math.nextafter(end_time, math.inf))
+
+        result = {'timestamp': []}
+        for field in HISTORY_FIELDS:
+            result[field] = []
+
+        if first >= last:
+            return result
+
+        if not step:
+            for i in range(first, last):
+                pos = self._pos(i)
+                result['timestamp'].append(self.timestamps[pos])
+                for field, column in self.columns.items():
+                    value = column[pos]
+                    result[field].append(None if math.isnan(value) else value)
+            return result
+
+        origin = self.timestamps[self._pos(first)] if start_time is None else start_time
+        bucket = None
+        sums = counts = None
+        for i in range(first, last + 1):
+            if i < last:
+                pos = self._pos(i)
+                index = int((self.timestamps[pos] - origin) // step)
+            else:
+                index = None
+
+            if index != bucket:
+                if bucket is not None:
+                    result['timestamp'].append(origin + bucket * step)
+                    for field in HISTORY_FIELDS:
+                        result[field].append(sums[field] / counts[field] if counts[field] else None)
+                if index is None:
+                    break
+                bucket = index
+                sums = dict.fromkeys(HISTORY_FIELDS, 0.0)
+                counts = dict.fromkeys(HISTORY_FIELDS, 0)
+
+            for field, column in self.columns.items():
+                value = column[pos]
+                if not math.isnan(value):
+                    sums[field] += value
+                    counts[field] += 1
+        return result
+
+
+class TelemetryHistory:
+    """Per-satellite telemetry ring buffers"""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def append(self, satellite_id, timestamp, data):
+        with self.lock:
+            buffer = self.buffers.get(satellite_id)
+            if buffer is None:
+                buffer = self.buffers[satellite_id] = TelemetryRingBuffer(self.capacity)
+            buffer.append(timestamp, data)
+
+    def query(self, satellite_id, start_time=None, end_time=None, step=None):
+        with self.lock:
+            buffer = self.buffers.get(satellite_id)
+            if buffer is None:
+                return None
+            return buffer.query(start_time, end_time, step)
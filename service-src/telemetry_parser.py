@@ -0,0 +1,316 @@
+import struct
+import threading
+
+from image_downlink import (IMAGE_SYNC, IMAGE_HEADER_SIZE, MalformedImageFrame,
+                            decode_image_frame, image_frame_size)
+
+# ASCII frame: ID:1,T:25.5,B:3.7,S:-45,A:520,V:7.6,STATUS:Active
+# key -> (field, converter, (min, max) or None)
+ASCII_FIELDS = {
+    'ID': ('satellite_id', int, (1, 255)),
+    'T': ('temperature', float, (-100.0, 150.0)),
+    'B': ('battery', float, (0.0, 10.0)),
+    'S': ('signal_strength', float, (-150.0, 0.0)),
+    'A': ('altitude', float, (0.0, 2000.0)),
+    'V': ('speed', float, (0.0, 12.0)),
+    'STATUS': ('status', str, None),
+}
+
+STATUSES = ('Active', 'Inactive', 'Maintenance')
+
+# Detection pipeline health from the satellite's Pi, tagged with the
+# satellite id by the controller:
+# HEALTH:ID:1,frames=1200,fps=2.5,latency_ms=310.2,dropped=4
+# key -> (field, converter)
+HEALTH_FIELDS = {
+    'frames': ('pipeline_frames', int),
+    'fps': ('pipeline_fps', float),
+    'latency_ms': ('pipeline_latency_ms', float),
+    'dropped': ('pipeline_dropped', int),
+}
+
+# Binary frame (little endian, 14 bytes):
+#   0xAA 0x55           sync
+#   uint8  id
+#   int16  temperature * 10
+#   uint16 battery * 1000 (mV)
+#   int8   signal strength, dBm
+#   uint16 altitude * 10
+#   uint16 speed * 100
+#   uint8  status index into STATUSES
+#   uint8  CRC-8 (poly 0x07) over id..status
+BINARY_SYNC = b'\xaa\x55'
+BINARY_BODY = struct.Struct('<BhHbHHB')
+BINARY_FRAME_SIZE = len(BINARY_SYNC) + BINARY_BODY.size + 1
+
+# Longest ASCII line we keep buffering before giving up on finding a newline
+MAX_LINE_LENGTH = 4096
+
+
+def _crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+class ParserStats:
+    """Counters for frames seen by the parser.
+
+    Counts are also added to parent, so per-source stats roll up into the
+    global parser_stats.
+    """
+
+    def __init__(self, parent=None):
+        self.lock = threading.Lock()
+        self.parent = parent
+        self.frames = 0
+        self.malformed = 0
+        self.ignored = 0
+
+    def add(self, frames=0, malformed=0, ignored=0):
+        with self.lock:
+            self.frames += frames
+            self.malformed += malformed
+            self.ignored += ignored
+        if self.parent is not None:
+            self.parent.add(frames, malformed, ignored)
+
+    def as_dict(self):
+        with self.lock:
+            return {'frames': self.frames, 'malformed': self.malformed, 'ignored': self.ignored}
+
+
+parser_stats = ParserStats()
+
+
+class MalformedFrame(ValueError):
+    pass
+
+
+def parse_ascii_frame(line):
+    """Parse one ASCII telemetry line.
+
+    Returns None for lines that are not telemetry frames (the receiver also
+    prints human-readable status lines); raises MalformedFrame for frames with
+    bad or out-of-range values.
+    """
+    if line.startswith('HEALTH:'):
+        return parse_health_line(line)
+    if 'ID:' not in line:
+        return None
+
+    data = {}
+    for part in line.split(','):
+        key, sep, value = part.partition(':')
+        if not sep:
+            continue
+        spec = ASCII_FIELDS.get(key.strip())
+        if spec is None:
+            continue
+        field, converter, limits = spec
+        try:
+            value = converter(value.strip())
+        except ValueError:
+            raise MalformedFrame(f"bad value for {key}: {value!r}")
+        if limits is not None and not limits[0] <= value <= limits[1]:
+            raise MalformedFrame(f"{key} out of range: {value}")
+        data[field] = value
+
+    if 'satellite_id' not in data:
+        raise MalformedFrame("missing ID")
+    return data
+
+
+def parse_health_line(line):
+    """Parse a HEALTH line into a frame of pipeline_* fields; raises MalformedFrame"""
+    data = {}
+    for part in line[len('HEALTH:'):].split(','):
+        key, sep, value = part.partition('=' if '=' in part else ':')
+        key = key.strip()
+        if key == 'ID':
+            field, converter = 'satellite_id', int
+        elif key in HEALTH_FIELDS:
+            field, converter = HEALTH_FIELDS[key]
+        else:
+            continue
+        try:
+            data[field] = converter(value.strip())
+        except ValueError:
+            raise MalformedFrame(f"bad value for {key}: {value!r}")
+
+    if 'satellite_id' not in data:
+        raise MalformedFrame("missing ID")
+    return data
+
+
+def is_health_frame(data):
+    """True for frames parsed from HEALTH lines, which carry no telemetry samples"""
+    return any(field in data for field, _ in HEALTH_FIELDS.values())
+
+
+def parse_binary_frame(frame):
+    """Decode a BINARY_FRAME_SIZE-byte frame that starts with BINARY_SYNC"""
+    body = frame[len(BINARY_SYNC):-1]
+    if crc8(body) != frame[-1]:
+        raise MalformedFrame("checksum mismatch")
+    satellite_id, temperature, battery, signal, altitude, speed, status = BINARY_BODY.unpack(body)
+    if satellite_id == 0 or status >= len(STATUSES):
+        raise MalformedFrame("bad id or status")
+    return {
+        'satellite_id': satellite_id,
+        'temperature': temperature / 10.0,
+        'battery': battery / 1000.0,
+        'signal_strength': float(signal),
+        'altitude': altitude / 10.0,
+        'speed': speed / 100.0,
+        'status': STATUSES[status],
+    }
+
+
+def encode_binary_frame(data):
+    """Build a binary frame from a telemetry dict (used by tests and simulators)"""
+    body = BINARY_BODY.pack(
+        data['satellite_id'],
+        int(round(data['temperature'] * 10)),
+        int(round(data['battery'] * 1000)),
+        int(round(data['signal_strength'])),
+        int(round(data['altitude'] * 10)),
+        int(round(data['speed'] * 100)),
+        STATUSES.index(data.get('status', 'Active')),
+    )
+    return BINARY_SYNC + body + bytes([crc8(body)])
+
+
+def _parse_line(line, frames, counts):
+    try:
+        data = parse_ascii_frame(line)
+    except MalformedFrame:
+        counts[0] += 1
+        return
+    if data is None:
+        counts[1] += 1
+    else:
+        frames.append(data)
+
+
+def parse_lines(lines, stats=parser_stats):
+    """Parse ASCII lines into frames, counting malformed and ignored lines"""
+    frames = []
+    counts = [0, 0]
+    for line in lines:
+        _parse_line(line, frames, counts)
+    stats.add(len(frames), counts[0], counts[1])
+    return frames
+
+
+class TelemetryDecoder:
+    """Incremental decoder for a byte stream of ASCII lines and binary frames.
+
+    Both kinds may be interleaved on one link; binary frames are recognised
+    by their sync bytes and validated by CRC, anything else is read as text
+    up to the next newline. Image downlink frames are passed to
+    image_handler, whose return value (uplink lines) is collected in replies.
+    Uplink command acknowledgements (CMD_ACK / CMD_NAK lines) are passed to
+    command_handler.
+    """
+
+    def __init__(self, stats=parser_stats, image_handler=None, command_handler=None):
+        self.buffer = bytearray()
+        self.stats = stats
+        self.image_handler = image_handler
+        self.command_handler = command_handler
+        self.replies = []
+
+    def _next_sync(self, pos):
+        telemetry = self.buffer.find(BINARY_SYNC, pos)
+        if self.image_handler is None:
+            return telemetry
+        image = self.buffer.find(IMAGE_SYNC, pos)
+        if telemetry < 0 or 0 <= image < telemetry:
+            return image
+        return telemetry
+
+    def _decode_image(self, pos, size, counts):
+        """Handle an image frame at pos; return the new position or None to wait"""
+        if size - pos < IMAGE_HEADER_SIZE:
+            return None
+        frame_size = image_frame_size(self.buffer[pos:pos + IMAGE_HEADER_SIZE])
+        if size - pos < frame_size:
+            return None
+        try:
+            frame = decode_image_frame(bytes(self.buffer[pos:pos + frame_size]))
+        except MalformedImageFrame:
+            counts[0] += 1
+            return pos + 1
+        reply = self.image_handler(*frame)
+        if reply:
+            self.replies.extend(reply)
+        return pos + frame_size
+
+    def feed(self, chunk):
+        """Add received bytes and return the list of decoded frames"""
+        buffer = self.buffer
+        buffer += chunk
+        frames = []
+        # [malformed, ignored]
+        counts = [0, 0]
+        pos = 0
+        size = len(buffer)
+
+        while pos < size:
+            sync = self._next_sync(pos)
+            newline = buffer.find(b'\n', pos)
+
+            if sync == pos and self.image_handler is not None and buffer.startswith(IMAGE_SYNC, pos):
+                next_pos = self._decode_image(pos, size, counts)
+                if next_pos is None:
+                    break
+                pos = next_pos
+                continue
+
+            if sync == pos:
+                if size - pos < BINARY_FRAME_SIZE:
+                    break
+                try:
+                    frames.append(parse_binary_frame(bytes(buffer[pos:pos + BINARY_FRAME_SIZE])))
+                    pos += BINARY_FRAME_SIZE
+                except MalformedFrame:
+                    # Not a real frame (or corrupted); resync on the next byte
+                    counts[0] += 1
+                    pos += 1
+                continue
+
+            if newline < 0 or (0 <= sync < newline):
+                if sync < 0:
+                    # Incomplete text line; wait for more bytes
+                    if size - pos > MAX_LINE_LENGTH:
+                        pos = size
+                    break
+                # Text before a sync marker without a newline is noise
+                pos = sync
+                continue
+
+            line = buffer[pos:newline].strip()
+            if line and self.command_handler is not None and line.startswith(b'CMD_'):
+                self.command_handler(line.decode('ascii', errors='replace'))
+            elif line:
+                _parse_line(line.decode('utf-8', errors='replace'), frames, counts)
+            pos = newline + 1
+
+        del buffer[:pos]
+        self.stats.add(len(frames), counts[0], counts[1])
+        return frames
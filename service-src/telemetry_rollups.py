@@ -0,0 +1,299 @@
+import math
+import threading
+import time
+from array import array
+
+from telemetry_history import HISTORY_FIELDS
+
+# (bucket width in seconds, buckets kept): 1 s for an hour, 1 min for two
+# days, 1 h for 90 days (longer than the raw store keeps samples)
+ROLLUP_TIERS = ((1, 3600), (60, 2 * 24 * 60), (3600, 90 * 24))
+# Queries without a step use the finest tier that answers in this many buckets
+MAX_POINTS = 1000
+# Satellites whose mean signal in a bucket is below this count as low-signal
+LOW_SIGNAL_DBM = -90.0
+
+
+class RollupTier:
+    """Fixed-width time buckets of min/max/sum/count/last for one satellite.
+
+    Buckets live in a direct-mapped ring: bucket index i is stored in slot
+    i % capacity, so adding a sample and finding a bucket are both O(1) and
+    the oldest bucket is reused once the ring wraps. Per-field statistics are
+    kept in flat arrays with one row of len(HISTORY_FIELDS) per slot.
+    """
+
+    def __init__(self, width, capacity):
+        self.width = width
+        self.capacity = capacity
+        size = capacity * len(HISTORY_FIELDS)
+        self.index = array('q', [-1]) * capacity
+        self.mins = array('d', [math.inf]) * size
+        self.maxs = array('d', [-math.inf]) * size
+        self.sums = array('d', bytes(8 * size))
+        self.counts = array('q', bytes(8 * size))
+        self.lasts = array('d', [math.nan]) * size
+        self.newest = -1
+
+    def _slot(self, index):
+        """Slot for bucket index, cleared if it held an older bucket; None if too old"""
+        if index <= self.newest - self.capacity:
+            return None
+        slot = index % self.capacity
+        held = self.index[slot]
+        if held != index:
+            if held > index:
+                return None
+            self.index[slot] = index
+            fields = len(HISTORY_FIELDS)
+            for i in range(slot * fields, (slot + 1) * fields):
+                self.mins[i] = math.inf
+                self.maxs[i] = -math.inf
+                self.sums[i] = 0.0
+                self.counts[i] = 0
+                self.lasts[i] = math.nan
+        if index > self.newest:
+            self.newest = index
+        return slot
+
+    def add(self, timestamp, values):
+        """Add one sample; values are in HISTORY_FIELDS order, NaN if missing"""
+        slot = self._slot(int(timestamp // self.width))
+        if slot is None:
+            return
+        base = slot * len(HISTORY_FIELDS)
+        for offset, value in enumerate(values):
+            if value != value:
+                continue
+            i = base + offset
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+            self.sums[i] += value
+            self.counts[i] += 1
+            self.lasts[i] = value
+
+    def merge(self, index, stats):
+        """Fold pre-aggregated (min, max, sum, count, last) per field into a bucket"""
+        slot = self._slot(index)
+        if slot is None:
+            return
+        base = slot * len(HISTORY_FIELDS)
+        for offset, (low, high, total, count, last) in enumerate(stats):
+            if not count:
+                continue
+            i = base + offset
+            self.mins[i] = min(self.mins[i], low)
+            self.maxs[i] = max(self.maxs[i], high)
+            self.sums[i] += total
+            self.counts[i] += count
+            if last is not None:
+                self.lasts[i] = last
+
+    def buckets(self, first, last):
+        """Yield (index, row offset) of held buckets with first <= index <= last"""
+        first = max(first, self.newest - self.capacity + 1)
+        last = min(last, self.newest)
+        fields = len(HISTORY_FIELDS)
+        for index in range(first, last + 1):
+            slot = index % self.capacity
+            if self.index[slot] == index:
+                yield index, slot * fields
+
+
+class TelemetryRollups:
+    """Incrementally maintained rollup tiers for every satellite.
+
+    Each frame updates one bucket per tier, so a range query costs at most
+    MAX_POINTS (or range / tier width) bucket reads however many raw samples
+    it spans.
+    """
+
+    def __init__(self, tiers=ROLLUP_TIERS):
+        self.tiers = tiers
+        self.satellites = {}
+        self.lock = threading.Lock()
+
+    def _tiers_for(self, satellite_id):
+        tiers = self.satellites.get(satellite_id)
+        if tiers is None:
+            tiers = self.satellites[satellite_id] = [RollupTier(width, capacity)
+                                                     for width, capacity in self.tiers]
+        return tiers
+
+    def add(self, satellite_id, timestamp, data):
+        values = []
+        for field in HISTORY_FIELDS:
+            value = data.get(field)
+            values.append(math.nan if value is None else float(value))
+        with self.lock:
+            for tier in self._tiers_for(satellite_id):
+                tier.add(timestamp, values)
+
+    def backfill(self, store):
+        """Rebuild the tiers from the database (at startup, before live frames)"""
+        now = time.time()
+        buckets = 0
+        for position, (width, capacity) in enumerate(self.tiers):
+            rows = store.aggregate(width, now - width * capacity, HISTORY_FIELDS)
+            with self.lock:
+                for satellite_id, index, stats in rows:
+                    self._tiers_for(satellite_id)[position].merge(index, stats)
+            buckets += len(rows)
+        print(f"Rebuilt {buckets} telemetry rollup buckets from {store.path}")
+
+    @staticmethod
+    def _covers(width, capacity, start_time, now):
+        # One bucket of slack, so "the last hour" measured a moment ago still fits
+        return start_time >= now - width * (capacity + 1)
+
+    def choose_tier(self, start_time, end_time, step=None):
+        """Position of the tier to answer a range query from"""
+        now = time.time()
+        if step is not None:
+            # Tiers whose buckets combine exactly into step buckets, finest first;
+            # the finest one reaching back to start_time, else the one reaching furthest
+            compatible = [position for position, (width, _) in enumerate(self.tiers)
+                          if width <= step and step % width == 0]
+            if not compatible:
+                return 0
+            for position in compatible:
+                width, capacity = self.tiers[position]
+                if self._covers(width, capacity, start_time, now):
+                    return position
+            return compatible[-1]
+        for position, (width, capacity) in enumerate(self.tiers):
+            covers = self._covers(width, capacity, start_time, now)
+            if covers and (end_time - start_time) / width <= MAX_POINTS:
+                return position
+        return len(self.tiers) - 1
+
+    def _range(self, start_time, end_time, step):
+        end_time = time.time() if end_time is None else end_time
+        start_time = end_time - 3600 if start_time is None else start_time
+        position = self.choose_tier(start_time, end_time, step)
+        width = self.tiers[position][0]
+        if step is not None and position == 0 and len(self.tiers) > 1:
+            # A step only the finest tier divides would come back mostly empty
+            # for a range that tier doesn't reach back to
+            capacity = self.tiers[0][1]
+            if not self._covers(width, capacity, start_time, time.time()):
+                raise ValueError(f"step must be a multiple of {self.tiers[1][0]} s "
+                                 f"for ranges older than {width * capacity} s")
+        step = step or width
+        first = int(start_time // width)
+        last = int(end_time // width)
+        return position, width, step, first, last
+
+    def query(self, satellite_id, start_time=None, end_time=None, step=None):
+        """Return min/max/mean/last per field for each bucket of step seconds.
+
+        {'tier': width, 'step': step, 'timestamp': [...],
+         <field>: {'min': [...], 'max': [...], 'mean': [...], 'last': [...]}}
+        Empty buckets are left out; None marks a field with no samples.
+        A step is answered from the finest tier it is a multiple of that reaches
+        back to start_time, else the coarsest it is a multiple of (which may
+        hold only the recent part of the range). Raises ValueError when that
+        would be the finest tier and the range starts before its reach.
+        """
+        position, width, step, first, last = self._range(start_time, end_time, step)
+        result = {'tier': width, 'step': step, 'timestamp': []}
+        for field in HISTORY_FIELDS:
+            result[field] = {'min': [], 'max': [], 'mean': [], 'last': []}
+
+        fields = len(HISTORY_FIELDS)
+        with self.lock:
+            tiers = self.satellites.get(satellite_id)
+            if tiers is None:
+                return None
+            tier = tiers[position]
+            # Combine tier buckets into step buckets: [min, max, sum, count, last] per field
+            current = None
+            acc = None
+            for index, base in tier.buckets(first, last):
+                out = int(index * width // step)
+                if out != current:
+                    if current is not None:
+                        self._emit(result, current * step, acc)
+                    current = out
+                    acc = [[math.inf, -math.inf, 0.0, 0, None] for _ in range(fields)]
+                for offset in range(fields):
+                    i = base + offset
+                    count = tier.counts[i]
+                    if not count:
+                        continue
+                    entry = acc[offset]
+                    entry[0] = min(entry[0], tier.mins[i])
+                    entry[1] = max(entry[1], tier.maxs[i])
+                    entry[2] += tier.sums[i]
+                    entry[3] += count
+                    entry[4] = tier.lasts[i]
+            if current is not None:
+                self._emit(result, current * step, acc)
+        return result
+
+    @staticmethod
+    def _emit(result, timestamp, acc):
+        if not any(entry[3] for entry in acc):
+            return
+        result['timestamp'].append(timestamp)
+        for field, (low, high, total, count, last) in zip(HISTORY_FIELDS, acc):
+            series = result[field]
+            series['min'].append(low if count else None)
+            series['max'].append(high if count else None)
+            series['mean'].append(total / count if count else None)
+            series['last'].append(last if count and last == last else None)
+
+    def fleet(self, start_time=None, end_time=None, step=None, low_signal=LOW_SIGNAL_DBM):
+        """Fleet-wide rollup per bucket.
+
+        {'tier', 'step', 'timestamp': [...], 'satellites': [...], 'low_signal': [...],
+         <field>: {'min': [...], 'max': [...], 'mean': [...]}}
+        satellites counts the satellites reporting in each bucket and
+        low_signal those whose mean signal strength was below low_signal dBm.
+        Raises ValueError for a step as query() does.
+        """
+        position, width, step, first, last = self._range(start_time, end_time, step)
+        fields = len(HISTORY_FIELDS)
+        signal = HISTORY_FIELDS.index('signal_strength')
+        # step bucket -> [per-field [min, max, sum, count], {satellite_id: [signal sum, count]}]
+        buckets = {}
+        with self.lock:
+            for satellite_id, tiers in self.satellites.items():
+                tier = tiers[position]
+                for index, base in tier.buckets(first, last):
+                    out = int(index * width // step)
+                    bucket = buckets.get(out)
+                    if bucket is None:
+                        bucket = buckets[out] = [[[math.inf, -math.inf, 0.0, 0] for _ in range(fields)], {}]
+                    totals, satellites = bucket
+                    for offset in range(fields):
+                        i = base + offset
+                        count = tier.counts[i]
+                        if not count:
+                            continue
+                        entry = totals[offset]
+                        entry[0] = min(entry[0], tier.mins[i])
+                        entry[1] = max(entry[1], tier.maxs[i])
+                        entry[2] += tier.sums[i]
+                        entry[3] += count
+                    reported = satellites.setdefault(satellite_id, [0.0, 0])
+                    reported[0] += tier.sums[base + signal]
+                    reported[1] += tier.counts[base + signal]
+
+        result = {'tier': width, 'step': step, 'timestamp': [], 'satellites': [], 'low_signal': []}
+        for field in HISTORY_FIELDS:
+            result[field] = {'min': [], 'max': [], 'mean': []}
+        for out in sorted(buckets):
+            totals, satellites = buckets[out]
+            result['timestamp'].append(out * step)
+            result['satellites'].append(len(satellites))
+            result['low_signal'].append(sum(1 for total, count in satellites.values()
+                                            if count and total / count < low_signal))
+            for field, (low, high, total, count) in zip(HISTORY_FIELDS, totals):
+                series = result[field]
+                series['min'].append(low if count else None)
+                series['max'].append(high if count else None)
+                series['mean'].append(total / count if count else None)
+        return result
@@ -0,0 +1,353 @@
+"""Standalone ingestion service shared by any number of web workers.
+
+Only one process can own the receiver serial ports, so under a multi-worker
+WSGI server the receivers, the image reassembler and the database writer run
+here and the workers follow it over a local socket:
+
+    python telemetry_service.py --listen 127.0.0.1:5055
+    TELEMETRY_SERVICE=127.0.0.1:5055 gunicorn -w 4 -b 0.0.0.0:5000 'app:create_app()'
+
+The protocol is newline-delimited JSON, one request per connection:
+    {"op": "follow"}             snapshot of the latest state, then every frame batch
+    {"op": "stats"}              parser, receiver and store counters
+    {"op": "images"}             completed downlinked images
+    {"op": "image", "image_id"}  one image (latest if null), data base64-encoded
+    {"op": "metrics"}            this process' metrics in Prometheus text format
+    {"op": "command", "command", "satellite_id", "priority"}   queue an uplink command
+    {"op": "commands", "command_id"}                           one command (all if omitted)
+"""
+import argparse
+import base64
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from command_queue import CommandQueue
+from image_downlink import image_reassembler
+from ingestion import TelemetryIngestor, detect_serial_sources, parse_source_spec
+from metrics import metrics
+from telemetry_parser import parser_stats, is_health_frame
+from telemetry_store import TelemetryStore
+from telemetry_stream import TelemetrySubscriber
+
+DEFAULT_ADDRESS = '127.0.0.1:5055'
+# Frame batches buffered per follower before it is disconnected to resync
+FOLLOWER_QUEUE = 1000
+KEEPALIVE = 15
+
+
+def parse_address(spec):
+    """'unix:/path/to.sock' or 'host:port' -> (family, address)"""
+    if spec.startswith('unix:'):
+        return socket.AF_UNIX, spec[len('unix:'):]
+    host, _, port = spec.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def ingestion_stats(ingestor, store):
+    return {
+        'parser': parser_stats.as_dict(),
+        'sources': ingestor.stats() if ingestor else [],
+        'store': {'written': store.written, 'dropped': store.dropped, 'queue': store.queue.qsize()},
+    }
+
+
+def ingestion_metric_families(stats):
+    """Metric families for a stats dict as returned by ingestion_stats()"""
+    parsed = stats['parser']
+    sources = stats['sources']
+    store = stats['store']
+    return [
+        ('telemetry_frames_total', 'counter', 'Frames seen by the parser by outcome',
+         [({'result': result}, parsed[result]) for result in ('frames', 'malformed', 'ignored')]),
+        ('telemetry_frames_dropped_total', 'counter', 'Frames dropped before or after storage',
+         [({'reason': 'duplicate'}, sum(s['duplicates'] for s in sources)),
+          ({'reason': 'store_queue_full'}, store['dropped'])]),
+        ('telemetry_source_lag_seconds', 'gauge', 'Received data still waiting to be read',
+         [({'source': s['name']}, s['lag']) for s in sources]),
+        ('telemetry_source_connected', 'gauge', 'Whether each receiver link is up',
+         [({'source': s['name']}, int(s['connected'])) for s in sources]),
+        ('telemetry_source_bytes_total', 'counter', 'Bytes read from each receiver',
+         [({'source': s['name']}, s['bytes']) for s in sources]),
+        ('telemetry_store_written_total', 'counter', 'Rows written to the telemetry database',
+         [({}, store['written'])]),
+        ('telemetry_store_queue_size', 'gauge', 'Rows waiting for the database writer',
+         [({}, store['queue'])]),
+    ]
+
+
+def image_info(image, with_data=False):
+    info = {k: v for k, v in image.items() if k != 'data'}
+    if with_data:
+        info['data'] = base64.b64encode(image['data']).decode('ascii')
+    return info
+
+
+class TelemetryServer:
+    """Runs the receivers and serves their frames to web workers.
+
+    The server keeps the latest frame per satellite and numbers every frame,
+    so each follower rebuilds exactly the same state and version numbers (and
+    hence ETags) as every other worker.
+    """
+
+    def __init__(self, address, sources, store, reassembler=image_reassembler):
+        self.address = address
+        self.store = store
+        self.reassembler = reassembler
+        self.commands = CommandQueue(self.send_uplink)
+        self.ingestor = TelemetryIngestor(sources, self.sink, image_reassembler=reassembler,
+                                          command_handler=self.commands.acknowledge)
+        self.epoch = int(time.time())
+        self.version = 0
+        self.versions = {}
+        self.latest = {}
+        self.followers = set()
+        self.lock = threading.Lock()
+        self.listener = None
+        metrics.register_collector(lambda: ingestion_metric_families(self.stats()))
+
+    def sink(self, frames):
+        # Stamped and stored under the lock, so receivers can't interleave out of order
+        with self.lock:
+            now = time.time()
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+            first_version = self.version + 1
+            for data in frames:
+                if not is_health_frame(data):
+                    self.store.add(data['satellite_id'], now, data)
+                data['timestamp'] = timestamp
+                satellite_id = data['satellite_id']
+                self.latest.setdefault(satellite_id, {}).update(data)
+                self.version += 1
+                self.versions[satellite_id] = self.version
+            line = json.dumps({'type': 'frames', 'time': now, 'version': first_version,
+                               'frames': frames}) + '\n'
+            for follower in self.followers:
+                follower.put(line)
+
+    def send_uplink(self, line):
+        return self.ingestor.send_uplink(line)
+
+    def stats(self):
+        return ingestion_stats(self.ingestor, self.store)
+
+    def start(self):
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+        self.listener = socket.socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(address)
+        self.listener.listen(64)
+        self.store.start()
+        self.ingestor.start()
+        self.commands.start()
+        threading.Thread(target=self._accept, daemon=True, name='telemetry-service').start()
+        print(f"Telemetry service listening on {self.address}")
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            conn.settimeout(5)
+            line = conn.makefile('rb').readline()
+            request = json.loads(line)
+            op = request.get('op')
+            if op == 'follow':
+                conn.settimeout(None)
+                self._follow(conn)
+                return
+            if op == 'stats':
+                reply = self.stats()
+            elif op == 'images':
+                reply = [image_info(image) for image in self.reassembler.list()]
+            elif op == 'image':
+                image = self.reassembler.get(request.get('image_id'))
+                reply = image_info(image, with_data=True) if image else None
+            elif op == 'metrics':
+                reply = {'text': metrics.render()}
+            elif op == 'command':
+                try:
+                    reply = self.commands.submit(request.get('command', ''), request.get('satellite_id', 0),
+                                                 request.get('priority', 'normal'))
+                except (TypeError, ValueError) as e:
+                    reply = {'service_error': str(e)}
+            elif op == 'commands':
+                command_id = request.get('command_id')
+                reply = self.commands.list() if command_id is None else self.commands.get(command_id)
+            else:
+                reply = {'service_error': f"unknown op {op!r}"}
+            conn.sendall(json.dumps(reply).encode() + b'\n')
+        except (OSError, ValueError) as e:
+            print(f"Telemetry service request failed: {e}")
+        finally:
+            conn.close()
+
+    def _follow(self, conn):
+        follower = TelemetrySubscriber(max_queue=FOLLOWER_QUEUE)
+        with self.lock:
+            # Snapshot and subscription under one lock, so no batch is missed or repeated
+            snapshot = json.dumps({'type': 'snapshot', 'epoch': self.epoch, 'version': self.version,
+                                   'versions': self.versions, 'latest': self.latest}) + '\n'
+            self.followers.add(follower)
+        try:
+            conn.sendall(snapshot.encode())
+            while True:
+                lines = follower.get(timeout=KEEPALIVE)
+                if follower.dropped:
+                    # The worker fell behind; make it reconnect and start from a fresh snapshot
+                    print("Telemetry follower fell behind; disconnecting it")
+                    return
+                conn.sendall(''.join(lines).encode() if lines else b'\n')
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.followers.discard(follower)
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.close()
+        self.commands.stop()
+        self.ingestor.stop()
+        self.store.stop()
+
+
+class TelemetryServiceClient:
+    """Web worker side of the ingestion service"""
+
+    def __init__(self, address):
+        self.address = address
+        self.connected = False
+
+    def _connect(self, timeout):
+        family, address = parse_address(self.address)
+        conn = socket.socket(family, socket.SOCK_STREAM)
+        conn.settimeout(timeout)
+        try:
+            conn.connect(address)
+        except OSError:
+            conn.close()
+            raise
+        return conn
+
+    def request(self, op, **params):
+        """Send one request and return the decoded reply; raises OSError if the service is down"""
+        params['op'] = op
+        with self._connect(timeout=5) as conn:
+            conn.sendall(json.dumps(params).encode() + b'\n')
+            line = conn.makefile('rb').readline()
+        if not line:
+            raise ConnectionError("telemetry service closed the connection")
+        reply = json.loads(line)
+        if isinstance(reply, dict) and 'service_error' in reply:
+            raise RuntimeError(reply['service_error'])
+        return reply
+
+    def follow(self, on_snapshot, on_frames):
+        """Apply the service's state in a background thread, reconnecting as needed"""
+        thread = threading.Thread(target=self._follow, args=(on_snapshot, on_frames),
+                                  daemon=True, name='telemetry-follower')
+        thread.start()
+        return thread
+
+    def _follow(self, on_snapshot, on_frames):
+        retry_delay = 1
+        while True:
+            try:
+                with self._connect(timeout=KEEPALIVE * 3) as conn:
+                    conn.sendall(b'{"op": "follow"}\n')
+                    for line in conn.makefile('rb'):
+                        if not line.strip():
+                            continue
+                        message = json.loads(line)
+                        if message['type'] == 'snapshot':
+                            on_snapshot(message)
+                            self.connected = True
+                            retry_delay = 1
+                        else:
+                            on_frames(message)
+                print("Telemetry service closed the connection. Reconnecting...")
+            except (OSError, ValueError) as e:
+                print(f"Telemetry service {self.address} unavailable: {e}")
+            self.connected = False
+            time.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 30)
+
+
+class RemoteImages:
+    """ImageReassembler-like view of the images held by the ingestion service"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def list(self):
+        return self.client.request('images')
+
+    def get(self, image_id=None):
+        image = self.client.request('image', image_id=image_id)
+        if image is not None:
+            image['data'] = base64.b64decode(image['data'])
+        return image
+
+
+class RemoteCommands:
+    """CommandQueue-like view of the ingestion service's uplink queue"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, body, satellite_id=0, priority='normal'):
+        try:
+            return self.client.request('command', command=body, satellite_id=satellite_id, priority=priority)
+        except RuntimeError as e:
+            raise ValueError(str(e))
+
+    def get(self, command_id):
+        return self.client.request('commands', command_id=command_id)
+
+    def list(self):
+        return self.client.request('commands')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Telemetry ingestion service for the web workers")
+    parser.add_argument('--listen', default=os.environ.get('TELEMETRY_SERVICE') or DEFAULT_ADDRESS,
+                        help="host:port or unix:/path/to.sock")
+    parser.add_argument('--sources', default=os.environ.get('TELEMETRY_SOURCES', ''),
+                        help="receiver list, e.g. serial:/dev/ttyUSB0,udp:0.0.0.0:5005 "
+                             "(default: every serial port that opens)")
+    parser.add_argument('--db', default='telemetry.db')
+    args = parser.parse_args(argv)
+
+    sources = parse_source_spec(args.sources) if args.sources else detect_serial_sources()
+    if not sources:
+        print("No telemetry receivers found")
+        return 1
+
+    store = TelemetryStore(args.db, batch_size=500, flush_interval=1.0, retention_days=30)
+    server = TelemetryServer(args.listen, sources, store)
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import queue
+import sqlite3
+import threading
+import time
+
+# Columns stored per sample, after satellite_id and timestamp
+STORE_FIELDS = ('temperature', 'battery', 'signal_strength', 'altitude', 'speed', 'status')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry (
+    satellite_id INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    temperature REAL,
+    battery REAL,
+    signal_strength REAL,
+    altitude REAL,
+    speed REAL,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS telemetry_satellite_time ON telemetry (satellite_id, timestamp);
+CREATE INDEX IF NOT EXISTS telemetry_time ON telemetry (timestamp);
+"""
+
+
+class TelemetryStore:
+    """SQLite telemetry log fed through a background writer thread.
+
+    add() only puts a row on a queue; the writer commits rows in batches of
+    batch_size or every flush_interval seconds, whichever comes first, and
+    periodically deletes rows older than retention_days.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0, retention_days=30,
+                 max_queue=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = retention_days * 86400
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.thread = None
+        self.stopping = threading.Event()
+        self.last_cleanup = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        # auto_vacuum only takes effect on a new database
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._writer, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+    def add(self, satellite_id, timestamp, data):
+        """Queue one sample for writing; never blocks the caller"""
+        if self.thread is None:
+            return
+        row = (satellite_id, timestamp) + tuple(data.get(field) for field in STORE_FIELDS)
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer(self):
+        conn = self._connect()
+        insert = "INSERT INTO telemetry VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        try:
+            while not (self.stopping.is_set() and self.queue.empty()):
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self.queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                if batch:
+                    try:
+                        with conn:
+                            conn.executemany(insert, batch)
+                        self.written += len(batch)
+                    except sqlite3.Error as e:
+                        print(f"Error writing telemetry: {e}")
+                self._cleanup(conn)
+        finally:
+            conn.close()
+
+    def _cleanup(self, conn):
+        now = time.time()
+        if now - self.last_cleanup < 3600:
+            return
+        self.last_cleanup = now
+        try:
+            with conn:
+                conn.execute("DELETE FROM telemetry WHERE timestamp < ?", (now - self.retention,))
+            conn.execute("PRAGMA incremental_vacuum")
+        except sqlite3.Error as e:
+            print(f"Error compacting telemetry: {e}")
+
+    def load_recent(self, seconds):
+        """Return rows from the last `seconds`, oldest first, as dicts"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "SELECT * FROM telemetry WHERE timestamp >= ? ORDER BY timestamp",
+                (time.time() - seconds,))
+            return [self._row_to_dict(row) for row in cursor]
+        finally:
+            conn.close()
+
+    def query(self, satellite_id, start_time=None, end_time=None):
+        """Return one satellite's rows in a time range, oldest first"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "SELECT * FROM telemetry WHERE satellite_id = ? AND timestamp >= ? AND timestamp <= ?"
+                " ORDER BY timestamp",
+                (satellite_id,
+                 start_time if start_time is not None else 0,
+                 end_time if end_time is not None else time.time()))
+            return [self._row_to_dict(row) for row in cursor]
+        finally:
+            conn.close()
+
+    def aggregate(self, width, since, fields=None):
+        """Per-satellite buckets of `width` seconds from `since` on.
+
+        Returns (satellite_id, bucket index, stats) where stats holds
+        (min, max, sum, count, last) for each field; the bucket index is
+        timestamp // width.
+        """
+        fields = fields or STORE_FIELDS[:-1]
+        stats = ', '.join(f"MIN({f}), MAX({f}), TOTAL({f}), COUNT({f})" for f in fields)
+        lasts = ', '.join(f"t.{f}" for f in fields)
+        # Aggregate per bucket, then join back on the bucket's newest row for the last values
+        sql = (f"SELECT a.*, {lasts} FROM ("
+               f"SELECT satellite_id, CAST(timestamp / ? AS INTEGER) AS bucket, MAX(timestamp) AS newest, {stats}"
+               f" FROM telemetry WHERE timestamp >= ? GROUP BY satellite_id, bucket) a"
+               f" JOIN telemetry t ON t.satellite_id = a.satellite_id AND t.timestamp = a.newest")
+        conn = self._connect()
+        try:
+            rows = []
+            seen = set()
+            for row in conn.execute(sql, (width, since)):
+                # Rows sharing the newest timestamp join more than once
+                if row[:2] in seen:
+                    continue
+                seen.add(row[:2])
+                values = row[3:3 + 4 * len(fields)]
+                last = row[3 + 4 * len(fields):]
+                rows.append((row[0], row[1], [tuple(values[i * 4:i * 4 + 4]) + (last[i],)
+                                              for i in range(len(fields))]))
+            return rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row):
+        data = {'satellite_id': row[0], 'timestamp': row[1]}
+        for field, value in zip(STORE_FIELDS, row[2:]):
+            if value is not None:
+                data[field] = value
+        return data
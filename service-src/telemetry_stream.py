@@ -0,0 +1,96 @@
+import json
+import threading
+from collections import deque
+
+
+class TelemetrySubscriber:
+    """Queue of pre-serialised events for one connected client.
+
+    The queue is bounded; when a slow client falls behind the oldest events
+    are dropped so the reader thread never blocks on it.
+    """
+
+    def __init__(self, satellite_ids=None, max_queue=100):
+        self.satellite_ids = satellite_ids
+        self.queue = deque(maxlen=max_queue)
+        self.dropped = 0
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def wants(self, satellite_id):
+        return self.satellite_ids is None or satellite_id in self.satellite_ids
+
+    def put(self, event):
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(event)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Return all queued events, waiting up to timeout for the first one"""
+        with self.condition:
+            if not self.queue and not self.closed:
+                self.condition.wait(timeout)
+            events = list(self.queue)
+            self.queue.clear()
+            return events
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+class TelemetryBroadcaster:
+    """Fans telemetry frames out to SSE subscribers.
+
+    Each frame is serialised once in publish() and the same bytes are handed
+    to every interested subscriber.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.event_id = 0
+
+    def subscribe(self, satellite_ids=None):
+        subscriber = TelemetrySubscriber(satellite_ids, self.max_queue)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+        subscriber.close()
+
+    def publish(self, data):
+        satellite_id = data.get('satellite_id')
+        with self.lock:
+            if not self.subscribers:
+                return
+            self.event_id += 1
+            event = f"id: {self.event_id}\nevent: telemetry\ndata: {json.dumps(data)}\n\n"
+            subscribers = [s for s in self.subscribers if s.wants(satellite_id)]
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def stream(self, subscriber, keepalive=15, initial=''):
+        """Generator of SSE text for a Flask streaming response.
+
+        initial (e.g. a snapshot of the current state) is sent first; it
+        bypasses the subscriber's bounded queue, so none of it is dropped.
+        """
+        try:
+            yield "retry: 3000\n\n" + initial
+            while not subscriber.closed:
+                events = subscriber.get(timeout=keepalive)
+                if events:
+                    yield ''.join(events)
+                else:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
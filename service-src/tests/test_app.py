@@ -0,0 +1,30 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    app.store_telemetry_frames([{'satellite_id': 1, 'temperature': 20.0, 'signal_strength': -60.0}])
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('query', ['/api/telemetry/1/rollup?from=nan', '/api/telemetry/1/rollup?from=-inf',
+                                   '/api/telemetry/fleet?to=inf', '/api/telemetry/fleet?low_signal=x'])
+def test_rollup_rejects_non_finite_range(client, query):
+    response = client.get(query)
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_rollup_rejects_step_without_a_covering_tier(client):
+    old = int(app.time.time()) - 86400
+    assert client.get(f'/api/telemetry/1/rollup?from={old}&step=90').status_code == 400
+    assert client.get(f'/api/telemetry/1/rollup?from={old}&step=120').status_code == 200
+
+
+@pytest.mark.parametrize('query', ['step=nan', 'step=inf', 'from=nan', 'to=-inf', 'step=abc'])
+def test_history_rejects_non_finite_arguments(client, query):
+    response = client.get(f'/api/telemetry/1/history?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
@@ -0,0 +1,40 @@
+from flask import Flask
+
+from http_cache import EncodedBody, compress_response
+
+BODY = b'{"satellites": [' + b'{"id": 1, "name": "SIT-1"}, ' * 40 + b'{}]}'
+
+
+def make_app():
+    app = Flask(__name__)
+    body = EncodedBody(BODY, 'application/json', 'satellites-1')
+    app.add_url_rule('/cached', 'cached', body.response)
+
+    @app.route('/dynamic')
+    def dynamic():
+        response = app.response_class(BODY, mimetype='application/json')
+        response.set_etag('dynamic-1')
+        return response
+
+    app.after_request(compress_response)
+    return app
+
+
+def test_each_encoding_has_its_own_etag():
+    client = make_app().test_client()
+    for path, etag in (('/cached', 'satellites-1'), ('/dynamic', 'dynamic-1')):
+        identity = client.get(path, headers={'Accept-Encoding': 'identity'})
+        gzipped = client.get(path, headers={'Accept-Encoding': 'gzip'})
+        assert identity.headers['ETag'] == f'"{etag}"'
+        assert gzipped.headers['Content-Encoding'] == 'gzip'
+        assert gzipped.headers['ETag'] == f'"{etag}-gz"'
+        assert 'Accept-Encoding' in gzipped.headers['Vary']
+
+
+def test_conditional_request_matches_only_its_variant():
+    client = make_app().test_client()
+    gzip = {'Accept-Encoding': 'gzip'}
+    response = client.get('/cached', headers=dict(gzip, **{'If-None-Match': '"satellites-1-gz"'}))
+    assert response.status_code == 304
+    response = client.get('/cached', headers=dict(gzip, **{'If-None-Match': '"satellites-1"'}))
+    assert response.status_code == 200
@@ -0,0 +1,35 @@
+from image_downlink import IMAGE_CHUNK, IMAGE_END, ImageReassembler, encode_image_frame
+from telemetry_parser import ParserStats, TelemetryDecoder
+
+
+def test_image_resend_after_dropped_chunk():
+    reassembler = ImageReassembler()
+    decoder = TelemetryDecoder(ParserStats(), image_handler=reassembler.handle)
+    chunks = [bytes([seq]) * 64 for seq in range(4)]
+    # Chunk 2 is lost on air
+    for seq in (0, 1, 3):
+        decoder.feed(encode_image_frame(IMAGE_CHUNK, 7, seq, 4, chunks[seq]))
+    assert decoder.replies == []
+    decoder.feed(encode_image_frame(IMAGE_END, 7, 0, 4))
+    assert decoder.replies == [b"IMG_NACK:7:2\n"]
+    assert reassembler.get(7) is None
+
+    decoder.replies = []
+    decoder.feed(encode_image_frame(IMAGE_CHUNK, 7, 2, 4, chunks[2]))
+    assert decoder.replies == [b"IMG_ACK:7\n"]
+    assert reassembler.get(7)['data'] == b''.join(chunks)
+    # A repeated END after completion is answered with another ACK
+    decoder.replies = []
+    decoder.feed(encode_image_frame(IMAGE_END, 7, 0, 4))
+    assert decoder.replies == [b"IMG_ACK:7\n"]
+
+
+def test_reused_id_with_another_chunk_count_is_not_acked():
+    reassembler = ImageReassembler()
+    for seq in range(2):
+        reassembler.handle(IMAGE_CHUNK, 5, seq, 2, b'old')
+    assert reassembler.get(5)['data'] == b'oldold'
+    # The Pi rebooted and reused id 5; the new image's START frame was lost
+    assert reassembler.handle(IMAGE_CHUNK, 5, 0, 3, b'new') == []
+    assert reassembler.get(5) is None
+    assert reassembler.handle(IMAGE_END, 5, 0, 3, b'') == [b"IMG_NACK:5:1,2\n"]
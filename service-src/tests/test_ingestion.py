@@ -0,0 +1,69 @@
+import socket
+import time
+
+from ingestion import FrameDeduplicator, TelemetryIngestor, UdpSource
+
+
+def frame(temperature=20.0):
+    return {'satellite_id': 1, 'temperature': temperature, 'battery': 3.9}
+
+
+def test_same_frame_from_another_source_is_dropped():
+    dedup = FrameDeduplicator(window=2.0)
+    assert dedup.filter([frame()], 'serial:a') == [frame()]
+    assert dedup.filter([frame()], 'serial:b') == []
+
+
+def test_repeated_reading_from_same_source_is_kept():
+    dedup = FrameDeduplicator(window=2.0)
+    assert dedup.filter([frame()], 'serial:a') == [frame()]
+    assert dedup.filter([frame()], 'serial:a') == [frame()]
+    assert dedup.filter([frame(), frame()], 'serial:a') == [frame(), frame()]
+
+
+def test_window_expiry(monkeypatch):
+    import ingestion
+    clock = [100.0]
+    monkeypatch.setattr(ingestion.time, 'monotonic', lambda: clock[0])
+    dedup = FrameDeduplicator(window=2.0)
+    dedup.filter([frame()], 'serial:a')
+    clock[0] += 1.0
+    assert dedup.filter([frame()], 'serial:b') == []
+    clock[0] += 2.5
+    assert dedup.filter([frame()], 'serial:b') == [frame()]
+    assert len(dedup.seen) == 1
+
+
+def test_different_frames_pass():
+    dedup = FrameDeduplicator()
+    assert len(dedup.filter([frame(20.0), frame(21.0)], 'serial:a')) == 2
+    assert dedup.filter([frame(22.0)], 'serial:b') == [frame(22.0)]
+
+
+def test_same_frame_from_two_udp_receivers_is_stored_once():
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    stored = []
+    source = UdpSource(f"127.0.0.1:{port}")
+    ingestor = TelemetryIngestor([source], stored.extend)
+    ingestor.start()
+    senders = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+    try:
+        deadline = time.monotonic() + 5
+        while not source.connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        line = b"ID:1,T:25.5,B:3.7,S:-45,A:520,V:7.6,STATUS:Active\n"
+        for sender in senders:
+            sender.sendto(line, ('127.0.0.1', port))
+        while source.bytes < 2 * len(line) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+    finally:
+        for sender in senders:
+            sender.close()
+        ingestor.stop()
+    assert len(stored) == 1
+    assert source.duplicates == 1
@@ -0,0 +1,58 @@
+import pytest
+
+from telemetry_parser import (MalformedFrame, ParserStats, TelemetryDecoder, encode_binary_frame,
+                              is_health_frame, parse_ascii_frame)
+
+SAMPLE = {'satellite_id': 2, 'temperature': 21.5, 'battery': 3.85, 'signal_strength': -60.0,
+          'altitude': 512.3, 'speed': 7.66, 'status': 'Active'}
+
+
+def test_health_line_is_parsed():
+    data = parse_ascii_frame("HEALTH:ID:3,frames=1200,fps=2.5,latency_ms=310.2,dropped=4")
+    assert data == {'satellite_id': 3, 'pipeline_frames': 1200, 'pipeline_fps': 2.5,
+                    'pipeline_latency_ms': 310.2, 'pipeline_dropped': 4}
+    assert is_health_frame(data)
+
+
+def test_health_line_without_id_is_malformed():
+    with pytest.raises(MalformedFrame):
+        parse_ascii_frame("HEALTH:frames=1200,fps=2.5,latency_ms=310.2,dropped=4")
+
+
+def test_telemetry_frame_is_not_health():
+    data = parse_ascii_frame("ID:1,T:25.5,B:3.7,S:-45,A:520,V:7.6,STATUS:Active")
+    assert data['temperature'] == 25.5
+    assert not is_health_frame(data)
+
+
+def test_binary_frame_fed_byte_by_byte():
+    decoder = TelemetryDecoder(ParserStats())
+    frame = encode_binary_frame(SAMPLE)
+    frames = []
+    for i in range(len(frame)):
+        frames.extend(decoder.feed(frame[i:i + 1]))
+    assert frames == [SAMPLE]
+    assert not decoder.buffer
+
+
+def test_ascii_and_binary_interleaved():
+    stats = ParserStats()
+    decoder = TelemetryDecoder(stats)
+    stream = (b"Radio initialized\n" + encode_binary_frame(SAMPLE)
+              + b"ID:1,T:25.5,B:3.7,S:-45,A:520,V:7.6,STATUS:Active\n"
+              + encode_binary_frame(dict(SAMPLE, satellite_id=3)))
+    frames = []
+    # Split at an awkward size so frames and lines straddle chunk boundaries
+    for i in range(0, len(stream), 5):
+        frames.extend(decoder.feed(stream[i:i + 5]))
+    assert [frame['satellite_id'] for frame in frames] == [2, 1, 3]
+    assert stats.as_dict() == {'frames': 3, 'malformed': 0, 'ignored': 1}
+
+
+def test_corrupted_binary_frame_is_skipped():
+    stats = ParserStats()
+    decoder = TelemetryDecoder(stats)
+    bad = bytearray(encode_binary_frame(SAMPLE))
+    bad[-1] ^= 0xFF
+    assert decoder.feed(bytes(bad) + encode_binary_frame(SAMPLE)) == [SAMPLE]
+    assert stats.as_dict()['malformed'] >= 1
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from telemetry_rollups import TelemetryRollups
+
+DAY = 86400
+
+
+@pytest.fixture
+def three_days():
+    """One sample per minute for satellite 1 over the last three days"""
+    rollups = TelemetryRollups()
+    now = time.time()
+    for offset in range(3 * DAY, 0, -60):
+        rollups.add(1, now - offset, {'temperature': 20.0, 'battery': 3.9, 'signal_strength': -60})
+    return rollups, now
+
+
+def test_step_picks_finest_tier_covering_start(three_days):
+    rollups, now = three_days
+    assert rollups.choose_tier(now - 1800, now, step=60) == 0
+    assert rollups.choose_tier(now - DAY, now, step=60) == 1
+    assert rollups.choose_tier(now - DAY, now, step=120) == 1
+
+
+def test_step_falls_back_to_coarsest_compatible_tier(three_days):
+    rollups, now = three_days
+    # Neither the 1 s nor the 1 min tier reaches back three days; 1 h can't resolve 60 s
+    assert rollups.choose_tier(now - 3 * DAY, now, step=60) == 1
+    # 90 s is not a multiple of 60 s, so only the 1 s tier resolves it
+    assert rollups.choose_tier(now - 3 * DAY, now, step=90) == 0
+    assert rollups.choose_tier(now - 3 * DAY, now, step=7200) == 2
+
+
+def test_step_60_over_days_uses_minute_tier(three_days):
+    rollups, now = three_days
+    result = rollups.query(1, now - 3 * DAY, now, step=60)
+    assert result['tier'] == 60
+    assert result['step'] == 60
+    # The minute tier keeps two days of buckets
+    assert len(result['timestamp']) >= 2 * 24 * 60 - 2
+    assert result['timestamp'][-1] - result['timestamp'][0] >= 2 * DAY - 180
+    assert result['temperature']['mean'][0] == 20.0
+
+
+def test_without_step_limits_bucket_count(three_days):
+    rollups, now = three_days
+    assert rollups.choose_tier(now - 600, now) == 0
+    assert rollups.choose_tier(now - DAY // 2, now) == 1
+    # A whole day of minutes is over MAX_POINTS
+    assert rollups.choose_tier(now - DAY, now) == 2
+    assert rollups.choose_tier(now - 3 * DAY, now) == 2
+    result = rollups.query(1, now - 3 * DAY, now)
+    assert result['tier'] == 3600
+    assert 72 <= len(result['timestamp']) <= 74
+
+
+def test_unknown_satellite():
+    assert TelemetryRollups().query(9) is None
+
+
+def test_step_only_the_finest_tier_divides_is_rejected_for_old_ranges(three_days):
+    rollups, now = three_days
+    with pytest.raises(ValueError):
+        rollups.query(1, now - 3 * DAY, now, step=90)
+    assert rollups.query(1, now - 1800, now, step=90)['tier'] == 1
@@ -26,6 +26,15 @@ struct Command {
   int value3;
 };
 
+// Binary image frames from the Pi (see raspberry-src/downlink.py) are
+// relayed one radio packet per frame, so no whole-image buffer is needed.
+// IMG_READY after each one tells the Pi to write the next:
+// 0xA5 0x5A | type | id(2) | seq(2) | total(2) | len | payload[len] | crc(2)
+#define IMAGE_FRAME_SYNC1 0xA5
+#define IMAGE_FRAME_SYNC2 0x5A
+#define IMAGE_FRAME_HEADER 10
+#define IMAGE_FRAME_MAX (IMAGE_FRAME_HEADER + 255 + 2)
+
 #define IMAGE_BUFFER_SIZE 1024
 byte imageBuffer[IMAGE_BUFFER_SIZE];
 int imageIndex = 0;
@@ -64,9 +73,11 @@ void loop() {
     lastTelemetry = millis();
   }
   receiveCommands();
-  receiveImageData();
-  
-  delay(100);
+  // Drain everything the Pi has sent; a fixed delay here lets the 64-byte
+  // UART buffer overflow mid-frame
+  while (Serial.available()) {
+    receiveImageData();
+  }
 }
 
 void sendTelemetry() {
@@ -98,10 +109,22 @@ void sendTelemetry() {
 
 void receiveCommands() {
   if (rf95.available()) {
-    uint8_t buf[sizeof(Command)];
+    uint8_t buf[RH_RF95_MAX_MESSAGE_LEN];
     uint8_t len = sizeof(buf);
     
     if (rf95.recv(buf, &len)) {
+      // Image ACK/NACK and numbered CMD:<id>:<sat>:<command> lines from the
+      // ground go straight to the Pi, which executes and acknowledges them
+      if (len >= 4 && (memcmp(buf, "IMG_", 4) == 0 || memcmp(buf, "CMD:", 4) == 0)) {
+        Serial.write(buf, len);
+        if (buf[len - 1] != '\n') {
+          Serial.println();
+        }
+        return;
+      }
+      if (len < sizeof(Command)) {
+        return;
+      }
       Command* cmd = (Command*)buf;
       
       Serial.print("COMMAND:");
@@ -143,7 +166,32 @@ void processCommand(Command* cmd) {
   }
 }
 
+void relayImageFrame() {
+  static uint8_t frame[IMAGE_FRAME_MAX];
+  if (Serial.readBytes(frame, IMAGE_FRAME_HEADER) != IMAGE_FRAME_HEADER ||
+      frame[1] != IMAGE_FRAME_SYNC2) {
+    return;
+  }
+  int rest = frame[IMAGE_FRAME_HEADER - 1] + 2;
+  if (Serial.readBytes(frame + IMAGE_FRAME_HEADER, rest) != (size_t)rest) {
+    return;
+  }
+  int size = IMAGE_FRAME_HEADER + rest;
+  if (size > RH_RF95_MAX_MESSAGE_LEN) {
+    return;
+  }
+  // The ground station checks the CRC and asks for missing chunks
+  rf95.send(frame, size);
+  rf95.waitPacketSent();
+}
+
 void receiveImageData() {
+  if (Serial.available() && Serial.peek() == IMAGE_FRAME_SYNC1) {
+    relayImageFrame();
+    // Also after a bad frame, so the Pi isn't left waiting for its timeout
+    Serial.println("IMG_READY");
+    return;
+  }
   if (Serial.available()) {
     String data = Serial.readStringUntil('\n');
     
@@ -170,6 +218,19 @@ void receiveImageData() {
       
       transmitImage(imageBuffer, imageIndex);
       
+    } else if (data.startsWith("CMD_ACK:") || data.startsWith("CMD_NAK:")) {
+      // Command acknowledgements from the Pi back to the ground station
+      data.trim();
+      rf95.send((uint8_t*)data.c_str(), data.length());
+      rf95.waitPacketSent();
+
+    } else if (data.startsWith("HEALTH:")) {
+      // Pipeline health from the Pi, tagged with our id for the ground station
+      data.trim();
+      String health = "HEALTH:ID:" + String(SATELLITE_ID) + "," + data.substring(7);
+      rf95.send((uint8_t*)health.c_str(), health.length());
+      rf95.waitPacketSent();
+
     } else if (data.startsWith("ZONE_DETECTED:")) {
       Serial.println("ZONE_ALERT");
 
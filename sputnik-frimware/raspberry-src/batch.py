@@ -0,0 +1,195 @@
+"""Offline oil spill detection over recorded videos and image archives.
+
+Work is split into video segments / image batches and spread over a process
+pool; every worker builds its detector (and optional CNN verifier) once and
+reuses its buffers for all frames it processes. Results are written as a
+compressed columnar .npz file:
+
+    python batch.py passes/*.mp4 archive/ -o results.npz [--model trained_model.tflite]
+
+Columns (one row per frame): source, frame, area_ratio, detected, verdict
+(1 spill, 0 clear), region_count; regions are stored flat in region_bbox /
+region_score with region_offset giving each frame's first region.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from detection import (OilSpillDetector, TiledDetector, CnnVerifier, DetectionConfig, IMAGE_EXTENSIONS,
+                       MIN_AREA_RATIO, MAX_AREA_RATIO)
+
+SEGMENT_FRAMES = 500
+IMAGE_BATCH = 200
+
+# Per-process detector, created by the pool initializer
+worker_detector = None
+
+
+def init_worker(config, model_path, tiled=False):
+    global worker_detector
+    # One OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+    # Jobs are unrelated images and segments: no score reuse between frames
+    # (a similar box in another image is a different region) and no per-frame
+    # cap, so every candidate gets a score
+    verifier = CnnVerifier(model_path, max_per_frame=None, cache_ttl=0) if model_path else None
+    if tiled:
+        worker_detector = TiledDetector(config, verifier)
+    else:
+        worker_detector = OilSpillDetector(config, verifier)
+
+
+def plan_jobs(inputs, segment_frames=SEGMENT_FRAMES, image_batch=IMAGE_BATCH):
+    """Return (sources, jobs); a job is (source_index, kind, payload)"""
+    sources = []
+    jobs = []
+    for path in inputs:
+        if os.path.isdir(path):
+            names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+            files = [os.path.join(path, n) for n in names]
+            source = len(sources)
+            sources.append(path)
+            for start in range(0, len(files), image_batch):
+                jobs.append((source, 'images', (start, files[start:start + image_batch])))
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            source = len(sources)
+            sources.append(path)
+            jobs.append((source, 'images', (0, [path])))
+        else:
+            capture = cv2.VideoCapture(path)
+            frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            capture.release()
+            source = len(sources)
+            sources.append(path)
+            if frame_count <= 0:
+                # Unknown length: read the whole file in one job
+                jobs.append((source, 'video', (path, 0, None)))
+                continue
+            for start in range(0, frame_count, segment_frames):
+                jobs.append((source, 'video', (path, start, min(start + segment_frames, frame_count))))
+    return sources, jobs
+
+
+def iter_job_frames(kind, payload):
+    if kind == 'images':
+        start, files = payload
+        for offset, name in enumerate(files):
+            frame = cv2.imread(name)
+            if frame is not None:
+                yield start + offset, frame
+        return
+
+    path, start, end = payload
+    capture = cv2.VideoCapture(path)
+    try:
+        if start:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while end is None or index < end:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def run_job(job):
+    """Process one job in a worker; returns columns for its frames"""
+    source, kind, payload = job
+    detector = worker_detector
+    frames = []
+    area_ratios = []
+    detected_flags = []
+    verdicts = []
+    region_counts = []
+    bboxes = []
+    scores = []
+
+    for index, frame in iter_job_frames(kind, payload):
+        detected, mask, area_ratio = detector.detect(frame)
+        regions = detector.find_regions(frame, mask)
+        # With a verifier only CNN-accepted regions are returned
+        verdict = detected and (detector.verifier is None or bool(regions))
+
+        frames.append(index)
+        area_ratios.append(area_ratio)
+        detected_flags.append(detected)
+        verdicts.append(verdict)
+        region_counts.append(len(regions))
+        for region in regions:
+            bboxes.append(region['bbox'])
+            scores.append(np.nan if region['score'] is None else region['score'])
+
+    return {
+        'source': np.full(len(frames), source, np.uint16),
+        'frame': np.array(frames, np.uint32),
+        'area_ratio': np.array(area_ratios, np.float32),
+        'detected': np.array(detected_flags, np.bool_),
+        'verdict': np.array(verdicts, np.bool_),
+        'region_count': np.array(region_counts, np.uint16),
+        'region_bbox': np.array(bboxes, np.int32).reshape(-1, 4),
+        'region_score': np.array(scores, np.float32),
+    }
+
+
+def merge_results(results):
+    """Concatenate per-job columns (already in job order) and add region_offset"""
+    columns = {}
+    for key in ('source', 'frame', 'area_ratio', 'detected', 'verdict', 'region_count',
+                'region_score'):
+        columns[key] = np.concatenate([r[key] for r in results] or [np.empty(0)])
+    columns['region_bbox'] = np.concatenate([r['region_bbox'] for r in results] or
+                                            [np.empty((0, 4), np.int32)])
+    offsets = np.cumsum(columns['region_count'], dtype=np.uint64)
+    columns['region_offset'] = offsets - columns['region_count'].astype(np.uint64)
+    return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch oil spill detection over recordings")
+    parser.add_argument('inputs', nargs='+', help="videos, image files or image directories")
+    parser.add_argument('-o', '--output', default='detections.npz')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--model', help="TFLite model for CNN verification of regions")
+    parser.add_argument('--segment', type=int, default=SEGMENT_FRAMES,
+                        help="video frames per job")
+    parser.add_argument('--rb-threshold', type=float, default=0.2)
+    parser.add_argument('--min-area', type=float, default=MIN_AREA_RATIO)
+    parser.add_argument('--max-area', type=float, default=MAX_AREA_RATIO)
+    parser.add_argument('--tiled', action='store_true',
+                        help="tiled coarse-to-fine detection for high-resolution recordings")
+    args = parser.parse_args(argv)
+
+    config = DetectionConfig(rb_threshold=args.rb_threshold,
+                             min_area_ratio=args.min_area, max_area_ratio=args.max_area)
+    sources, jobs = plan_jobs(args.inputs, args.segment)
+    print(f"{len(sources)} inputs, {len(jobs)} jobs, {args.workers} workers")
+
+    start = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(config, args.model, args.tiled)) as pool:
+        for done, result in enumerate(pool.map(run_job, jobs), 1):
+            results.append(result)
+            print(f"\r{done}/{len(jobs)} jobs", end='', flush=True)
+    print()
+
+    columns = merge_results(results)
+    np.savez_compressed(args.output, sources=np.array(sources), **columns)
+
+    frames = len(columns['frame'])
+    elapsed = time.time() - start
+    print(f"{frames} frames in {elapsed:.1f}s ({frames / elapsed if elapsed else 0:.1f} fps), "
+          f"{int(columns['verdict'].sum())} with spills -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
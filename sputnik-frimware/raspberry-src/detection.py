@@ -0,0 +1,572 @@
+"""Oil spill detection pipeline shared by main.py, mainwithAI.py and sputnic.py.
+
+Stages: Gaussian blur -> HSV threshold -> R/B index threshold -> morphology
+-> area ratio, plus optional contour extraction and CNN verification of the
+candidate regions.
+
+Run headless on images or videos:
+    python detection.py pass1.mp4 frames/*.png [--model trained_model.tflite]
+    python detection.py survey_4k.png --tiled [--workers 4]
+"""
+import argparse
+import copy
+import math
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+
+import cv2
+import numpy as np
+
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+MIN_AREA_RATIO = 0.01
+MAX_AREA_RATIO = 0.6
+ROI_SIZE = 64
+# Regions classified per invoke() when max_per_frame doesn't set it
+VERIFY_BATCH = 8
+# Tiled detection: full-resolution tile edge and the context read around each
+# tile, which must cover the blur and morphology kernels (2 + 4 + 4 px by default)
+TILE_SIZE = 512
+TILE_MARGIN = 16
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class DetectionConfig:
+    """Tunable thresholds for every pipeline stage"""
+
+    def __init__(self, blur_size=5, sat_max=60, val_min=40, val_max=180,
+                 rb_threshold=0.2, morph_size=5, morph_open=True, morph_close=True,
+                 min_area_ratio=MIN_AREA_RATIO, max_area_ratio=MAX_AREA_RATIO):
+        # blur_size / morph_size of 0 disables that stage
+        self.blur_size = blur_size
+        self.sat_max = sat_max
+        self.val_min = val_min
+        self.val_max = val_max
+        self.rb_threshold = rb_threshold
+        self.morph_size = morph_size
+        self.morph_open = morph_open
+        self.morph_close = morph_close
+        self.min_area_ratio = min_area_ratio
+        self.max_area_ratio = max_area_ratio
+
+
+class OilSpillDetector:
+    """HSV + R/B-index oil spill detector with preallocated working buffers.
+
+    Buffers are allocated once for the frame size and reused on every call,
+    so the returned mask is overwritten by the next detect().
+    """
+
+    def __init__(self, config=None, verifier=None, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+        self.config = config or DetectionConfig()
+        self.verifier = verifier
+        config = self.config
+
+        self.kernel = np.ones((config.morph_size, config.morph_size), np.uint8) if config.morph_size else None
+        # H is unrestricted
+        self.hsv_lower = np.array([0, 0, config.val_min], np.uint8)
+        self.hsv_upper = np.array([255, config.sat_max, config.val_max], np.uint8)
+
+        # |r - b| / (r + b + 1) <= t  is checked as  den * |r - b| <= num * (r + b + 1)
+        # with t = num / den, so the test is exact in integers and can't overflow
+        ratio = Fraction(config.rb_threshold).limit_denominator(100)
+        self.rb_num = ratio.numerator
+        self.rb_den = ratio.denominator
+        fits_int16 = max(self.rb_den * 255, self.rb_num * 511) <= np.iinfo(np.int16).max
+        self.rb_dtype = np.int16 if fits_int16 else np.int32
+
+        self.allocate(width, height)
+
+    def allocate(self, width, height):
+        self.width = width
+        self.height = height
+        self.total_pixels = width * height
+        self.blur = np.empty((height, width, 3), np.uint8)
+        self.hsv = np.empty((height, width, 3), np.uint8)
+        self.hsv_mask = np.empty((height, width), np.uint8)
+        self.rb_diff = np.empty((height, width), self.rb_dtype)
+        self.rb_sum = np.empty((height, width), self.rb_dtype)
+        self.rb_mask = np.empty((height, width), np.bool_)
+        self.combined = np.empty((height, width), np.uint8)
+        self.opened = np.empty((height, width), np.uint8)
+        self.mask = np.empty((height, width), np.uint8)
+
+    def compute_mask(self, frame):
+        """Run the pixel stages and return the (reused) binary mask"""
+        height, width = frame.shape[:2]
+        if width != self.width or height != self.height:
+            self.allocate(width, height)
+        config = self.config
+
+        if config.blur_size:
+            cv2.GaussianBlur(frame, (config.blur_size, config.blur_size), 0, dst=self.blur)
+            blurred = self.blur
+        else:
+            blurred = frame
+
+        cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV, dst=self.hsv)
+        cv2.inRange(self.hsv, self.hsv_lower, self.hsv_upper, dst=self.hsv_mask)
+
+        b = blurred[:, :, 0]
+        r = blurred[:, :, 2]
+        np.subtract(r, b, out=self.rb_diff, dtype=self.rb_dtype)
+        np.abs(self.rb_diff, out=self.rb_diff)
+        if self.rb_den != 1:
+            np.multiply(self.rb_diff, self.rb_den, out=self.rb_diff)
+        np.add(r, b, out=self.rb_sum, dtype=self.rb_dtype)
+        np.add(self.rb_sum, 1, out=self.rb_sum)
+        if self.rb_num != 1:
+            np.multiply(self.rb_sum, self.rb_num, out=self.rb_sum)
+        np.less_equal(self.rb_diff, self.rb_sum, out=self.rb_mask)
+
+        self.combined.fill(0)
+        cv2.bitwise_and(self.hsv_mask, self.hsv_mask, dst=self.combined,
+                        mask=self.rb_mask.view(np.uint8))
+
+        if self.kernel is None:
+            return self.combined
+        mask = self.combined
+        if config.morph_open:
+            cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel, dst=self.opened)
+            mask = self.opened
+        if config.morph_close:
+            cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel, dst=self.mask)
+            mask = self.mask
+        return mask
+
+    def detect(self, frame):
+        """Return (detected, mask, area_ratio) for the whole frame"""
+        mask = self.compute_mask(frame)
+        oil_pixels = cv2.countNonZero(mask)
+        area_ratio = oil_pixels / self.total_pixels
+
+        detected = self.config.min_area_ratio < area_ratio < self.config.max_area_ratio
+        return detected, mask, area_ratio
+
+    def find_regions(self, frame, mask):
+        """Return candidate regions as dicts with bbox, area_ratio and score.
+
+        Regions whose bounding box is outside the configured area ratio range
+        are dropped. With a verifier, score is the CNN probability and
+        only regions it accepts are returned (regions left over the verifier's
+        per-frame budget are skipped until a later frame); otherwise score is
+        None.
+        """
+        return extract_regions(frame, mask, self.config, self.verifier)
+
+
+def extract_regions(frame, mask, config, verifier=None):
+    """OilSpillDetector.find_regions() for any mask; area ratios are relative to the mask size"""
+    total_pixels = mask.shape[0] * mask.shape[1]
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    regions = []
+    for cnt in contours:
+        x, y, w, h = cv2.boundingRect(cnt)
+        area_ratio = (w * h) / total_pixels
+        if area_ratio < config.min_area_ratio or area_ratio > config.max_area_ratio:
+            continue
+        regions.append({'bbox': (x, y, w, h), 'area_ratio': area_ratio, 'score': None})
+
+    if verifier is None:
+        return regions
+
+    scores = verifier.score_regions(frame, [region['bbox'] for region in regions])
+    verified = []
+    for region, score in zip(regions, scores):
+        region['score'] = score
+        if score is not None and score > verifier.threshold:
+            verified.append(region)
+    return verified
+
+
+class TemporalDetector:
+    """Frame-to-frame wrapper around OilSpillDetector for mostly static scenes.
+
+    - Motion gate: each frame is shrunk to a small grayscale thumbnail; if its
+      mean absolute difference from the last processed thumbnail is below
+      motion_threshold, the previous result is reused and the full pipeline is
+      skipped (at most max_skip frames in a row).
+    - Smoothing: masks are blended into a running average and the reported
+      mask is the thresholded average, so single-frame speckle fades out.
+    - Persistence: a detection is reported only after persist_frames
+      consecutive frames detect it.
+    """
+
+    def __init__(self, detector=None, motion_threshold=2.0, max_skip=30, alpha=0.3,
+                 persist_frames=5, thumb_size=(80, 60)):
+        self.detector = detector or OilSpillDetector()
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+        self.alpha = alpha
+        self.persist_frames = persist_frames
+        self.thumb_size = thumb_size
+        self.thumb_color = np.empty((thumb_size[1], thumb_size[0], 3), np.uint8)
+        self.thumb = np.empty((thumb_size[1], thumb_size[0]), np.uint8)
+        self.previous_thumb = np.empty_like(self.thumb)
+        self.thumb_diff = np.empty_like(self.thumb)
+        self.accumulator = None
+        self.smoothed = None
+        self.has_previous = False
+        self.skipped_in_row = 0
+        self.streak = 0
+        self.candidate = False
+        self.last_result = None
+        self.frames = 0
+        self.skipped = 0
+
+    def reset(self):
+        self.has_previous = False
+        self.accumulator = None
+        self.streak = 0
+        self.candidate = False
+        self.last_result = None
+
+    def _allocate(self, height, width):
+        self.accumulator = np.zeros((height, width), np.float32)
+        self.smoothed = np.empty((height, width), np.uint8)
+
+    def _static(self, frame):
+        cv2.resize(frame, self.thumb_size, dst=self.thumb_color, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.thumb_color, cv2.COLOR_BGR2GRAY, dst=self.thumb)
+        if not self.has_previous:
+            return False
+        cv2.absdiff(self.thumb, self.previous_thumb, dst=self.thumb_diff)
+        return cv2.mean(self.thumb_diff)[0] < self.motion_threshold
+
+    def detect(self, frame):
+        """Return (detected, mask, area_ratio) like OilSpillDetector.detect()"""
+        self.frames += 1
+        if (self._static(frame) and self.last_result is not None
+                and self.skipped_in_row < self.max_skip):
+            self.skipped += 1
+            self.skipped_in_row += 1
+            # An unchanged scene still counts towards persistence
+            if self.candidate:
+                self.streak += 1
+            _, mask, area_ratio = self.last_result
+            self.last_result = (self.streak >= self.persist_frames, mask, area_ratio)
+            return self.last_result
+
+        self.skipped_in_row = 0
+        self.previous_thumb[:] = self.thumb
+        self.has_previous = True
+
+        raw_detected, mask, _ = self.detector.detect(frame)
+        height, width = mask.shape
+        if self.accumulator is None or self.accumulator.shape != (height, width):
+            self._allocate(height, width)
+            self.accumulator[:] = mask
+        cv2.accumulateWeighted(mask, self.accumulator, self.alpha)
+        cv2.inRange(self.accumulator, 127.5, 255.0, dst=self.smoothed)
+        area_ratio = cv2.countNonZero(self.smoothed) / (height * width)
+
+        config = self.detector.config
+        smoothed_detected = config.min_area_ratio < area_ratio < config.max_area_ratio
+        self.candidate = raw_detected and smoothed_detected
+        self.streak = self.streak + 1 if self.candidate else 0
+        detected = self.streak >= self.persist_frames
+
+        self.last_result = (detected, self.smoothed, area_ratio)
+        return self.last_result
+
+
+class TiledDetector:
+    """Coarse-to-fine detector for frames larger than the camera resolution.
+
+    A copy downscaled to coarse_width goes through the pipeline first, without
+    morphological opening, which would erase features the downscale already
+    shrank. Only the tile_size tiles where it finds candidate pixels are then
+    processed at full resolution. Each tile is read with a margin of
+    surrounding pixels, so blur and morphology see the same neighbourhood as
+    on the whole frame, and its interior is copied into one full-size mask.
+    With workers > 1 tiles run on a thread pool (OpenCV releases the GIL).
+
+    detect() and find_regions() match OilSpillDetector, with area ratios
+    relative to the full frame; frames no wider than coarse_width just go
+    through OilSpillDetector. The returned mask is reused by the next call.
+    """
+
+    def __init__(self, config=None, verifier=None, tile_size=TILE_SIZE, coarse_width=FRAME_WIDTH,
+                 margin=TILE_MARGIN, workers=1):
+        self.config = config or DetectionConfig()
+        self.verifier = verifier
+        self.tile_size = tile_size
+        self.coarse_width = coarse_width
+        self.margin = margin
+        coarse_config = copy.copy(self.config)
+        coarse_config.morph_open = False
+        self.coarse = OilSpillDetector(coarse_config)
+        self.whole = OilSpillDetector(self.config)
+        self.coarse_frame = None
+        self.mask = None
+        # OilSpillDetector buffers per thread and tile shape, so edge tiles don't reallocate
+        self.local = threading.local()
+        self.pool = ThreadPoolExecutor(workers) if workers > 1 else None
+        # Tiles in the last frame and how many were processed at full resolution
+        self.tiles_total = 0
+        self.tiles_processed = 0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def _tile_detector(self, width, height):
+        detectors = getattr(self.local, 'detectors', None)
+        if detectors is None:
+            detectors = self.local.detectors = {}
+        detector = detectors.get((width, height))
+        if detector is None:
+            detector = detectors[(width, height)] = OilSpillDetector(self.config, width=width, height=height)
+        return detector
+
+    def candidate_tiles(self, frame):
+        """Return (x0, y0, x1, y1) of the tiles the downscaled pass flags"""
+        height, width = frame.shape[:2]
+        scale = self.coarse_width / width
+        coarse_height = max(1, round(height * scale))
+        if self.coarse_frame is None or self.coarse_frame.shape[:2] != (coarse_height, self.coarse_width):
+            self.coarse_frame = np.empty((coarse_height, self.coarse_width, 3), np.uint8)
+        cv2.resize(frame, (self.coarse_width, coarse_height), dst=self.coarse_frame,
+                   interpolation=cv2.INTER_AREA)
+        coarse_mask = self.coarse.compute_mask(self.coarse_frame)
+
+        tiles = []
+        self.tiles_total = 0
+        for y0 in range(0, height, self.tile_size):
+            y1 = min(y0 + self.tile_size, height)
+            for x0 in range(0, width, self.tile_size):
+                x1 = min(x0 + self.tile_size, width)
+                self.tiles_total += 1
+                # The tile's footprint in the coarse mask, one coarse pixel wider on each side
+                footprint = coarse_mask[max(int(y0 * scale) - 1, 0):math.ceil(y1 * scale) + 1,
+                                        max(int(x0 * scale) - 1, 0):math.ceil(x1 * scale) + 1]
+                if cv2.countNonZero(footprint):
+                    tiles.append((x0, y0, x1, y1))
+        return tiles
+
+    def _process(self, frame, tile):
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = tile
+        ex0 = max(x0 - self.margin, 0)
+        ey0 = max(y0 - self.margin, 0)
+        ex1 = min(x1 + self.margin, width)
+        ey1 = min(y1 + self.margin, height)
+        detector = self._tile_detector(ex1 - ex0, ey1 - ey0)
+        mask = detector.compute_mask(frame[ey0:ey1, ex0:ex1])
+        self.mask[y0:y1, x0:x1] = mask[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0]
+
+    def detect(self, frame):
+        """Return (detected, mask, area_ratio) like OilSpillDetector.detect()"""
+        height, width = frame.shape[:2]
+        if width <= self.coarse_width:
+            self.tiles_total = self.tiles_processed = 1
+            return self.whole.detect(frame)
+
+        if self.mask is None or self.mask.shape != (height, width):
+            self.mask = np.zeros((height, width), np.uint8)
+        else:
+            self.mask.fill(0)
+        tiles = self.candidate_tiles(frame)
+        self.tiles_processed = len(tiles)
+        if self.pool is not None and len(tiles) > 1:
+            list(self.pool.map(lambda tile: self._process(frame, tile), tiles))
+        else:
+            for tile in tiles:
+                self._process(frame, tile)
+
+        area_ratio = cv2.countNonZero(self.mask) / (height * width)
+        detected = self.config.min_area_ratio < area_ratio < self.config.max_area_ratio
+        return detected, self.mask, area_ratio
+
+    def find_regions(self, frame, mask):
+        return extract_regions(frame, mask, self.config, self.verifier)
+
+
+def load_interpreter(model_path):
+    """Create a TFLite interpreter, preferring the small tflite_runtime package"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=model_path)
+
+
+class CnnVerifier:
+    """Classifies candidate regions with the trained TFLite model.
+
+    All regions of a frame are resized into one preallocated batch tensor and
+    classified with a single invoke(). Scores of regions whose box hasn't
+    moved since the previous frame are reused for up to cache_ttl frames, and
+    at most max_per_frame regions are sent to the model per frame (largest
+    first); the rest wait for the next frame. Offline use on unrelated images
+    wants cache_ttl=0 and max_per_frame=None, so every region is scored fresh.
+    """
+
+    def __init__(self, model_path="trained_model.tflite", roi_size=ROI_SIZE, threshold=0.5,
+                 max_per_frame=8, cache_ttl=30, cache_tolerance=4):
+        self.roi_size = roi_size
+        self.threshold = threshold
+        self.max_per_frame = max_per_frame
+        self.cache_ttl = cache_ttl
+        self.cache_tolerance = cache_tolerance
+        self.interpreter = load_interpreter(model_path)
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+
+        # Ask for a batch-sized input; models with a fixed batch of 1 fall
+        # back to one invoke per region
+        input_index = self.input_details[0]['index']
+        batch_size = max_per_frame or VERIFY_BATCH
+        try:
+            self.interpreter.resize_tensor_input(input_index, [batch_size, roi_size, roi_size, 3])
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch_size
+        except (ValueError, RuntimeError):
+            self.interpreter.allocate_tensors()
+            self.batch_size = 1
+        self.input_index = input_index
+        self.output_index = self.output_details[0]['index']
+
+        self.batch = np.zeros((self.batch_size, roi_size, roi_size, 3), np.float32)
+        self.roi_buffer = np.empty((roi_size, roi_size, 3), np.uint8)
+        # (x, y, w, h) -> (score, frame number it was computed on)
+        self.cache = {}
+        self.frame_number = 0
+        self.invocations = 0
+
+    def _lookup(self, bbox):
+        tolerance = self.cache_tolerance
+        for cached_bbox, entry in self.cache.items():
+            if all(abs(a - b) <= tolerance for a, b in zip(bbox, cached_bbox)):
+                return entry
+        return None
+
+    def _fill(self, slot, frame, bbox):
+        x, y, w, h = bbox
+        cv2.resize(frame[y:y + h, x:x + w], (self.roi_size, self.roi_size), dst=self.roi_buffer)
+        np.multiply(self.roi_buffer, np.float32(1 / 255.0), out=self.batch[slot])
+
+    def _run(self, count):
+        if self.batch_size == 1:
+            scores = []
+            for i in range(count):
+                self.interpreter.set_tensor(self.input_index, self.batch[i:i + 1])
+                self.interpreter.invoke()
+                self.invocations += 1
+                scores.append(float(self.interpreter.get_tensor(self.output_index)[0][0]))
+            return scores
+        self.interpreter.set_tensor(self.input_index, self.batch)
+        self.interpreter.invoke()
+        self.invocations += 1
+        return [float(v) for v in self.interpreter.get_tensor(self.output_index)[:count, 0]]
+
+    def score_regions(self, frame, bboxes):
+        """Return a score per bbox; None for regions over this frame's budget"""
+        self.frame_number += 1
+        scores = [None] * len(bboxes)
+        new_cache = {}
+        pending = []
+        for i, bbox in enumerate(bboxes):
+            entry = self._lookup(bbox)
+            if entry is not None and self.frame_number - entry[1] <= self.cache_ttl:
+                scores[i] = entry[0]
+                new_cache[bbox] = entry
+            else:
+                pending.append(i)
+
+        pending.sort(key=lambda i: bboxes[i][2] * bboxes[i][3], reverse=True)
+        if self.max_per_frame:
+            pending = pending[:self.max_per_frame]
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            for slot, i in enumerate(chunk):
+                self._fill(slot, frame, bboxes[i])
+            for i, score in zip(chunk, self._run(len(chunk))):
+                scores[i] = score
+                new_cache[bboxes[i]] = (score, self.frame_number)
+
+        # Only boxes seen in this frame can match the next one
+        self.cache = new_cache
+        return scores
+
+    def predict(self, roi):
+        h, w = roi.shape[:2]
+        self._fill(0, roi, (0, 0, w, h))
+        return self._run(1)[0]
+
+
+def iter_frames(path):
+    """Yield (index, frame) from an image file, image directory or video"""
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for index, name in enumerate(names):
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is not None:
+                yield index, frame
+        return
+
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        frame = cv2.imread(path)
+        if frame is not None:
+            yield 0, frame
+        return
+
+    capture = cv2.VideoCapture(path)
+    index = 0
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect oil spills in images or videos")
+    parser.add_argument('inputs', nargs='+', help="image files, image directories or videos")
+    parser.add_argument('--model', help="TFLite model for CNN verification of regions")
+    parser.add_argument('--rb-threshold', type=float, default=0.2)
+    parser.add_argument('--min-area', type=float, default=MIN_AREA_RATIO)
+    parser.add_argument('--max-area', type=float, default=MAX_AREA_RATIO)
+    parser.add_argument('--temporal', action='store_true',
+                        help="smooth detections across consecutive frames of each input")
+    parser.add_argument('--tiled', action='store_true',
+                        help="coarse pass first, then full resolution only on candidate tiles")
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE)
+    parser.add_argument('--workers', type=int, default=1, help="threads for tiled detection")
+    args = parser.parse_args(argv)
+
+    config = DetectionConfig(rb_threshold=args.rb_threshold,
+                             min_area_ratio=args.min_area, max_area_ratio=args.max_area)
+    verifier = CnnVerifier(args.model) if args.model else None
+    if args.tiled:
+        detector = TiledDetector(config, verifier, tile_size=args.tile_size, workers=args.workers)
+    else:
+        detector = OilSpillDetector(config, verifier)
+
+    temporal = TemporalDetector(detector) if args.temporal else None
+
+    print("path,frame,detected,area_ratio,regions")
+    for path in args.inputs:
+        if temporal is not None:
+            temporal.reset()
+        for index, frame in iter_frames(path):
+            if temporal is not None:
+                detected, mask, area_ratio = temporal.detect(frame)
+            else:
+                detected, mask, area_ratio = detector.detect(frame)
+            regions = detector.find_regions(frame, mask)
+            print(f"{path},{index},{int(detected)},{area_ratio:.4f},{len(regions)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import random
+import struct
+import threading
+from binascii import crc_hqx
+from collections import OrderedDict
+
+import cv2
+
+# Binary image downlink frame (little endian), mirrored in
+# service-src/image_downlink.py:
+#   0xA5 0x5A        sync
+#   uint8  type      IMAGE_START / IMAGE_CHUNK / IMAGE_END
+#   uint16 image_id
+#   uint16 seq       chunk number (0 for START/END)
+#   uint16 total     number of chunks in the image
+#   uint8  length    payload length
+#   payload          START: uint32 image size; CHUNK: JPEG bytes; END: empty
+#   uint16 crc       CRC-16/CCITT (init 0xFFFF) over type..payload
+IMAGE_SYNC = b'\xa5\x5a'
+IMAGE_HEADER = struct.Struct('<BHHHB')
+IMAGE_START = 1
+IMAGE_CHUNK = 2
+IMAGE_END = 3
+
+CHUNK_SIZE = 64
+# The controller's 64-byte UART buffer can't hold a frame while it is busy on
+# the radio, so each frame waits for the IMG_READY that follows the previous one. The
+# timeout keeps older firmware (which never answers) working, just slower.
+READY_TIMEOUT = 1.0
+
+# Byte budgets per downlink pass (9600 baud moves roughly 900 bytes/s)
+PREVIEW_BYTE_BUDGET = 800
+IMAGE_BYTE_BUDGET = 4000
+# Largest side sent for full frames, matching the old fixed 320x240
+MAX_IMAGE_SIDE = 320
+ROI_PADDING = 0.15
+MIN_QUALITY = 20
+MAX_QUALITY = 85
+MIN_SIDE = 32
+
+
+def encode_image_frame(frame_type, image_id, seq, total, payload=b''):
+    body = IMAGE_HEADER.pack(frame_type, image_id, seq, total, len(payload)) + payload
+    return IMAGE_SYNC + body + struct.pack('<H', crc_hqx(body, 0xFFFF))
+
+
+class ImageDownlink:
+    """Sends JPEGs as CRC-checked binary chunks and resends what the ground misses.
+
+    The last `keep` images stay cached until the ground station ACKs them so
+    IMG_NACK requests can be answered with just the missing chunks. Frames go
+    out one at a time, each once the controller has relayed the previous one
+    (see ready()), so a transfer runs at the radio's pace.
+    """
+
+    def __init__(self, serial_conn, chunk_size=CHUNK_SIZE, keep=4, ready_timeout=READY_TIMEOUT):
+        self.serial_conn = serial_conn
+        self.chunk_size = chunk_size
+        self.keep = keep
+        self.ready_timeout = ready_timeout
+        # Random per boot, so the ground station doesn't take a new image for
+        # the one it completed under the same id before a reboot
+        self.next_id = random.SystemRandom().randrange(1, 0x10000)
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        # Set while the controller is idle; cleared by each frame written
+        self.ready_event = threading.Event()
+        self.ready_event.set()
+        # Only one transfer at a time may consume IMG_READY lines
+        self.send_lock = threading.Lock()
+
+    def send(self, image_bytes):
+        """Send a whole image and return its id"""
+        chunks = [image_bytes[i:i + self.chunk_size]
+                  for i in range(0, len(image_bytes), self.chunk_size)]
+        total = len(chunks)
+        with self.lock:
+            image_id = self.next_id
+            self.next_id = self.next_id % 0xFFFF + 1
+            self.pending[image_id] = chunks
+            while len(self.pending) > self.keep:
+                self.pending.popitem(last=False)
+
+        frames = [encode_image_frame(IMAGE_START, image_id, 0, total, struct.pack('<I', len(image_bytes)))]
+        frames.extend(encode_image_frame(IMAGE_CHUNK, image_id, seq, total, chunk)
+                      for seq, chunk in enumerate(chunks))
+        frames.append(encode_image_frame(IMAGE_END, image_id, 0, total))
+        self._write_frames(frames)
+        return image_id
+
+    def resend(self, image_id, seqs):
+        """Resend the listed chunks; returns False if the image is no longer cached"""
+        with self.lock:
+            chunks = self.pending.get(image_id)
+        if chunks is None:
+            return False
+        total = len(chunks)
+        frames = [encode_image_frame(IMAGE_CHUNK, image_id, seq, total, chunks[seq])
+                  for seq in seqs if 0 <= seq < total]
+        frames.append(encode_image_frame(IMAGE_END, image_id, 0, total))
+        self._write_frames(frames)
+        return True
+
+    def acknowledge(self, image_id):
+        with self.lock:
+            self.pending.pop(image_id, None)
+
+    def ready(self):
+        """The controller sent IMG_READY: it has relayed a frame and can take the next"""
+        self.ready_event.set()
+
+    def _write_frames(self, frames):
+        with self.send_lock:
+            missed = 0
+            for frame in frames:
+                # A frame the controller dropped is NACKed by the ground station
+                # like one lost on air, so a missing IMG_READY only costs the timeout
+                if not self.ready_event.wait(self.ready_timeout):
+                    missed += 1
+                self.ready_event.clear()
+                # Each frame is one write, so replies from other threads land between frames
+                self.serial_conn.write(frame)
+            if missed:
+                print(f"No IMG_READY from controller for {missed} of {len(frames)} frames")
+
+
+def pad_roi(roi, frame_shape, padding=ROI_PADDING):
+    """Grow an (x, y, w, h) box by a fraction of its size, clipped to the frame"""
+    x, y, w, h = roi
+    height, width = frame_shape[:2]
+    dx = int(w * padding)
+    dy = int(h * padding)
+    x0 = max(0, x - dx)
+    y0 = max(0, y - dy)
+    x1 = min(width, x + w + dx)
+    y1 = min(height, y + h + dy)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class DownlinkEncoder:
+    """Encodes frames as JPEGs that fit a byte budget.
+
+    When a region of interest is given the frame is cropped to it first, so
+    the budget is spent on the detected spill instead of open water. Quality
+    is binary-searched at each scale before falling back to a smaller image.
+    """
+
+    def __init__(self, max_side=MAX_IMAGE_SIDE, min_quality=MIN_QUALITY, max_quality=MAX_QUALITY):
+        self.max_side = max_side
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+
+    def crop(self, frame, roi=None):
+        if roi is None or roi[2] == 0 or roi[3] == 0:
+            return frame
+        x, y, w, h = pad_roi(roi, frame.shape)
+        return frame[y:y + h, x:x + w]
+
+    def _resize(self, image, max_side):
+        height, width = image.shape[:2]
+        scale = min(1.0, max_side / max(height, width))
+        if scale >= 1.0:
+            return image
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def _encode(self, image, quality):
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes()
+
+    def encode(self, frame, roi=None, budget=IMAGE_BYTE_BUDGET, max_side=None):
+        """Return JPEG bytes of the (cropped) frame no larger than budget if possible"""
+        image = self.crop(frame, roi)
+        side = max_side or self.max_side
+        smallest = None
+        while True:
+            resized = self._resize(image, side)
+            # Highest quality that fits at this size
+            lo, hi = self.min_quality, self.max_quality
+            best = None
+            while lo <= hi:
+                quality = (lo + hi) // 2
+                data = self._encode(resized, quality)
+                if len(data) <= budget:
+                    best = data
+                    lo = quality + 5
+                else:
+                    smallest = data
+                    hi = quality - 5
+            if best is not None:
+                return best
+            if side <= MIN_SIDE:
+                # Nothing fits; send the smallest attempt rather than nothing
+                return smallest
+            side = max(MIN_SIDE, int(side * 0.7))
+
+    def encode_progressive(self, frame, roi=None, preview_budget=PREVIEW_BYTE_BUDGET,
+                           budget=IMAGE_BYTE_BUDGET):
+        """Return [preview, refinement] JPEGs; the small preview goes out first"""
+        preview = self.encode(frame, roi, preview_budget, max_side=self.max_side // 3)
+        refinement = self.encode(frame, roi, budget)
+        return [preview, refinement]
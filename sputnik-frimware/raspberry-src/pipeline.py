@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+from collections import deque
+
+
+class StageStats:
+    """Throughput and latency counters for one pipeline stage"""
+
+    def __init__(self, name, window=100):
+        self.name = name
+        self.lock = threading.Lock()
+        self.count = 0
+        self.dropped = 0
+        self.times = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency):
+        with self.lock:
+            self.count += 1
+            self.times.append(time.monotonic())
+            self.latencies.append(latency)
+
+    def drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def fps(self):
+        with self.lock:
+            if len(self.times) < 2:
+                return 0.0
+            span = self.times[-1] - self.times[0]
+            return (len(self.times) - 1) / span if span > 0 else 0.0
+
+    def latency_ms(self):
+        with self.lock:
+            if not self.latencies:
+                return 0.0
+            return 1000 * sum(self.latencies) / len(self.latencies)
+
+    def summary(self):
+        return (f"{self.name}: {self.fps():.1f} fps, {self.latency_ms():.1f} ms, "
+                f"{self.count} done, {self.dropped} dropped")
+
+
+class LockedWriter:
+    """Serialises writes from several threads so messages never interleave"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        with self.lock:
+            return self.conn.write(data)
+
+
+def put_latest(q, item, stats=None):
+    """Put item on a bounded queue, discarding the oldest entry if it is full"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+                if stats is not None:
+                    stats.drop()
+            except queue.Empty:
+                pass
+
+
+class PeriodicScheduler:
+    """Runs callbacks on wall-clock intervals, independent of frame rate"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def every(self, interval, callback, run_now=False):
+        next_run = time.monotonic() if run_now else time.monotonic() + interval
+        self.tasks.append([next_run, interval, callback])
+
+    def run_pending(self):
+        now = time.monotonic()
+        for task in self.tasks:
+            if now >= task[0]:
+                task[2]()
+                # Skip missed runs instead of firing them all at once
+                task[0] = max(task[0] + task[1], now)
+
+
+class Cooldown:
+    """Allows an action at most once per interval seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last = None
+
+    def ready(self):
+        now = time.monotonic()
+        if self.last is not None and now - self.last < self.interval:
+            return False
+        self.last = now
+        return True
@@ -4,21 +4,67 @@ import serial
 import time
 import base64
 import io
+import os
+import sys
+import queue
+import argparse
+import threading
+from collections import OrderedDict
 from PIL import Image
-
-FRAME_WIDTH = 640
-FRAME_HEIGHT = 480
-MIN_AREA_RATIO = 0.01 
-MAX_AREA_RATIO = 0.6
+from detection import OilSpillDetector, TemporalDetector, FRAME_WIDTH, FRAME_HEIGHT
+from pipeline import StageStats, PeriodicScheduler, Cooldown, LockedWriter, put_latest
+from downlink import ImageDownlink, DownlinkEncoder, PREVIEW_BYTE_BUDGET, IMAGE_BYTE_BUDGET
 
 SERIAL_PORT = '/dev/ttyUSB0' 
 BAUD_RATE = 9600
+# Uplink commands are CMD:<command_id>:<satellite_id>:<command>; 0 addresses every satellite
+SATELLITE_ID = 1
+# Recently executed (command id, command) pairs, so a resend after a lost ACK
+# isn't run twice
+COMMAND_HISTORY = 64
+# 'binary' = CRC-framed chunks with retransmission (downlink.py),
+# 'hex' = legacy IMAGE_DATA:<hex> lines for older controller firmware
+DOWNLINK_PROTOCOL = 'binary'
+
+DETECTION_WORKERS = 2
+TX_QUEUE_SIZE = 4
+STATS_INTERVAL = 10
+# Wall-clock periods, in seconds
+IMAGE_INTERVAL = 30
+HEALTH_INTERVAL = 10
+DETECTION_COOLDOWN = 5
 
 class SatelliteController:
-    def __init__(self):
+    def __init__(self, detection_workers=DETECTION_WORKERS, headless=False, temporal=False):
+        self.headless = headless
+        # Temporal detection keeps state across consecutive frames, so it
+        # needs a single worker that sees every frame in order
+        self.temporal = temporal
+        if temporal:
+            detection_workers = 1
         self.serial_conn = None
+        # Every serial write goes through this: the transmit and command threads share the link
+        self.writer = None
+        self.downlink = None
+        self.executed_commands = OrderedDict()
+        self.encoder = DownlinkEncoder()
         self.camera = None
         self.frame_count = 0
+        self.detector = OilSpillDetector()
+        self.detection_workers = detection_workers
+        self.running = threading.Event()
+        # capture -> detection -> main loop; only the newest frames are kept
+        self.frame_queue = queue.Queue(maxsize=detection_workers * 2)
+        self.result_queue = queue.Queue(maxsize=detection_workers * 2)
+        # main loop -> transmit thread
+        self.tx_queue = queue.Queue(maxsize=TX_QUEUE_SIZE)
+        self.latest_frame = None
+        self.threads = []
+        self.stats = {
+            'capture': StageStats('capture'),
+            'detect': StageStats('detect'),
+            'transmit': StageStats('transmit'),
+        }
         
     def initialize_camera(self):
         self.camera = cv2.VideoCapture(0)
@@ -33,6 +79,8 @@ class SatelliteController:
     def initialize_serial(self):
         try:
             self.serial_conn = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
+            self.writer = LockedWriter(self.serial_conn)
+            self.downlink = ImageDownlink(self.writer)
             time.sleep(2)
             print("Serial connection established")
             return True
@@ -41,50 +89,115 @@ class SatelliteController:
             return False
     
     def detect_oil_spill(self, frame):
-        frame_blur = cv2.GaussianBlur(frame, (5, 5), 0)
-        hsv = cv2.cvtColor(frame_blur, cv2.COLOR_BGR2HSV)
-        h, s, v = cv2.split(hsv)
-        sat_mask = cv2.inRange(s, 0, 60)
-        val_mask = cv2.inRange(v, 40, 180)
-        hsv_mask = cv2.bitwise_and(sat_mask, val_mask)
-        
-        b, g, r = cv2.split(frame_blur)
-        rb_index = (r.astype(np.float32) - b.astype(np.float32)) / (r + b + 1)
-        rb_mask = cv2.inRange(rb_index, -0.2, 0.2)
-        mask = cv2.bitwise_and(hsv_mask, rb_mask)
-        
-        kernel = np.ones((5, 5), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-        
-        oil_pixels = cv2.countNonZero(mask)
-        total_pixels = FRAME_WIDTH * FRAME_HEIGHT
-        area_ratio = oil_pixels / total_pixels
-        
-        detected = MIN_AREA_RATIO < area_ratio < MAX_AREA_RATIO
-        return detected, mask, area_ratio
+        return self.detector.detect(frame)
     
-    def frame_to_bytes(self, frame):
-        resized = cv2.resize(frame, (320, 240))
-        
-        _, buffer = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, 70])
-        return buffer.tobytes()
+    def capture_loop(self):
+        while self.running.is_set():
+            start = time.monotonic()
+            ret, frame = self.camera.read()
+            if not ret:
+                print("Camera read failed")
+                self.running.clear()
+                break
+            self.frame_count += 1
+            self.latest_frame = frame
+            self.stats['capture'].record(time.monotonic() - start)
+            put_latest(self.frame_queue, (self.frame_count, frame, start), self.stats['capture'])
+    
+    def detect_loop(self):
+        # Each worker owns a detector because its buffers are reused per call
+        detector = TemporalDetector() if self.temporal else OilSpillDetector()
+        while self.running.is_set():
+            try:
+                frame_count, frame, captured_at = self.frame_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            detected, mask, area_ratio = detector.detect(frame)
+            # Bounding box of the detected pixels, used to crop the downlink image
+            roi = cv2.boundingRect(mask) if detected else None
+            self.stats['detect'].record(time.monotonic() - captured_at)
+            # The mask buffer is reused by the next detect(); copy it only for display
+            mask = None if self.headless else mask.copy()
+            put_latest(self.result_queue, (frame_count, frame, mask, detected, area_ratio, roi),
+                       self.stats['detect'])
     
-    def send_image_to_arduino(self, frame):
+    def transmit_loop(self):
+        while self.running.is_set() or not self.tx_queue.empty():
+            try:
+                kind, payload, queued_at = self.tx_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if kind == 'alert':
+                self.send_zone_alert(*payload)
+            elif kind == 'image':
+                self.send_image_to_arduino(payload)
+            elif kind == 'roi_image':
+                self.send_image_to_arduino(*payload)
+            elif kind == 'health':
+                self.send_health(payload)
+            elif kind == 'resend':
+                self.resend_image_chunks(*payload)
+            self.stats['transmit'].record(time.monotonic() - queued_at)
+    
+    def queue_downlink(self, kind, payload):
+        """Hand a message to the transmit thread without blocking detection"""
+        if not self.serial_conn:
+            return
         try:
-            image_bytes = self.frame_to_bytes(frame)
+            self.tx_queue.put_nowait((kind, payload, time.monotonic()))
+        except queue.Full:
+            self.stats['transmit'].drop()
+    
+    def start_pipeline(self):
+        self.running.set()
+        targets = [self.capture_loop] + [self.detect_loop] * self.detection_workers
+        if self.serial_conn:
+            targets.extend([self.transmit_loop, self.command_loop])
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True, name=target.__name__)
+            thread.start()
+            self.threads.append(thread)
+    
+    def stop_pipeline(self, timeout=5):
+        """Stop the worker threads; those still running after timeout stay in self.threads"""
+        self.running.clear()
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        if self.threads:
+            print(f"Still running after {timeout} s: {', '.join(t.name for t in self.threads)}")
+    
+    def print_stats(self):
+        print(" | ".join(stats.summary() for stats in self.stats.values()))
+    
+    def frame_to_bytes(self, frame, roi=None, budget=IMAGE_BYTE_BUDGET):
+        return self.encoder.encode(frame, roi, budget)
+    
+    def send_image_to_arduino(self, frame, roi=None):
+        try:
+            if DOWNLINK_PROTOCOL == 'binary':
+                # A small preview first so operators see something quickly,
+                # then the refinement within the full budget
+                images = self.encoder.encode_progressive(frame, roi, PREVIEW_BYTE_BUDGET, IMAGE_BYTE_BUDGET)
+                for image_bytes in images:
+                    image_id = self.downlink.send(image_bytes)
+                    print(f"Image {image_id} sent: {len(image_bytes)} bytes")
+                return True
             
-            self.serial_conn.write(b"IMAGE_START:\n")
+            image_bytes = self.frame_to_bytes(frame, roi)
+            
+            self.writer.write(b"IMAGE_START:\n")
             time.sleep(0.01)
             
             chunk_size = 64
             for i in range(0, len(image_bytes), chunk_size):
                 chunk = image_bytes[i:i+chunk_size]
                 hex_data = chunk.hex()
-                self.serial_conn.write(f"IMAGE_DATA:{hex_data}\n".encode())
+                self.writer.write(f"IMAGE_DATA:{hex_data}\n".encode())
                 time.sleep(0.005) 
 
-            self.serial_conn.write(b"IMAGE_END\n")
+            self.writer.write(b"IMAGE_END\n")
             time.sleep(0.01)
             
             print(f"Image sent: {len(image_bytes)} bytes")
@@ -94,25 +207,135 @@ class SatelliteController:
             print(f"Error sending image: {e}")
             return False
     
+    def resend_image_chunks(self, image_id, seqs):
+        try:
+            if self.downlink.resend(image_id, seqs):
+                print(f"Image {image_id}: resent {len(seqs)} chunks")
+            else:
+                print(f"Image {image_id} no longer cached, cannot resend")
+        except Exception as e:
+            print(f"Error resending image: {e}")
+    
     def send_zone_alert(self, area_ratio, frame_count):
         try:
             alert_msg = f"ZONE_DETECTED:Oil spill detected, area ratio: {area_ratio:.4f}, frame: {frame_count}\n"
-            self.serial_conn.write(alert_msg.encode())
+            self.writer.write(alert_msg.encode())
             print(f"Zone alert sent: {alert_msg.strip()}")
         except Exception as e:
             print(f"Error sending zone alert: {e}")
     
-    def listen_for_commands(self):
+    def health_message(self):
+        capture = self.stats['capture']
+        detect = self.stats['detect']
+        return (f"HEALTH:frames={self.frame_count},fps={detect.fps():.1f},"
+                f"latency_ms={detect.latency_ms():.1f},dropped={capture.dropped + detect.dropped}")
+    
+    def send_health(self, message):
         try:
-            if self.serial_conn.in_waiting > 0:
-                command = self.serial_conn.readline().decode().strip()
-                if command:
-                    print(f"Received command: {command}")
-                    self.process_command(command)
+            self.writer.write(f"{message}\n".encode())
         except Exception as e:
-            print(f"Error reading command: {e}")
+            print(f"Error sending health telemetry: {e}")
+    
+    def send_periodic_image(self):
+        frame = self.latest_frame
+        if frame is not None:
+            self.queue_downlink('image', frame if self.headless else frame.copy())
+    
+    def draw_overlay(self, frame, frame_count, detected, area_ratio):
+        # The camera may not honour the requested resolution
+        height = frame.shape[0]
+        if detected:
+            cv2.putText(frame, "OIL SPILL DETECTED",
+                      (20, 40),
+                      cv2.FONT_HERSHEY_SIMPLEX,
+                      1, (0, 0, 255), 2)
+        else:
+            cv2.putText(frame, "Monitoring...",
+                      (20, 40),
+                      cv2.FONT_HERSHEY_SIMPLEX,
+                      0.7, (0, 255, 0), 2)
+        
+        cv2.putText(frame, f"Frame: {frame_count}",
+                  (20, height - 60),
+                  cv2.FONT_HERSHEY_SIMPLEX,
+                  0.5, (255, 255, 255), 1)
+        
+        cv2.putText(frame, f"Area Ratio: {area_ratio:.4f}",
+                  (20, height - 40),
+                  cv2.FONT_HERSHEY_SIMPLEX,
+                  0.5, (255, 255, 255), 1)
+        
+        cv2.putText(frame, f"Status: {'DETECTED' if detected else 'CLEAR'}",
+                  (20, height - 20),
+                  cv2.FONT_HERSHEY_SIMPLEX,
+                  0.5, (0, 255, 0) if not detected else (0, 0, 255), 1)
+    
+    def command_loop(self):
+        """Read uplink lines as they arrive, independent of frame processing"""
+        while self.running.is_set():
+            try:
+                # Returns as soon as a line is complete, or after the 1 s timeout
+                line = self.serial_conn.readline()
+            except Exception as e:
+                print(f"Error reading command: {e}")
+                time.sleep(1)
+                continue
+            line = line.decode(errors='replace').strip()
+            if not line:
+                continue
+            try:
+                self.handle_uplink(line)
+            except Exception as e:
+                # Keep reading: command ACKs and image flow control arrive on this thread too
+                print(f"Error handling uplink line {line!r}: {e}")
+    
+    def handle_uplink(self, line):
+        if line == "IMG_READY":
+            # Flow control from the controller for the image frame in flight
+            if self.downlink:
+                self.downlink.ready()
+            return
+        
+        if not line.startswith("CMD:"):
+            # Unnumbered lines (image ACK/NACK, older ground software) need no reply
+            print(f"Received command: {line}")
+            self.process_command(line)
+            return
+        
+        parts = line.split(":", 3)
+        if len(parts) != 4:
+            print(f"Malformed command: {line}")
+            return
+        _, command_id, satellite_id, command = parts
+        try:
+            if int(satellite_id) not in (0, SATELLITE_ID):
+                return
+        except ValueError:
+            print(f"Malformed command: {line}")
+            return
+        
+        # The body too: a restarted ground station may reuse an id for another command
+        key = (command_id, command)
+        reply = self.executed_commands.get(key)
+        if reply is None:
+            print(f"Received command {command_id}: {command}")
+            try:
+                ok = self.process_command(command)
+                reply = f"CMD_ACK:{command_id}" if ok else f"CMD_NAK:{command_id}:unknown command"
+            except Exception as e:
+                reply = f"CMD_NAK:{command_id}:{e}"
+            self.executed_commands[key] = reply
+            while len(self.executed_commands) > COMMAND_HISTORY:
+                self.executed_commands.popitem(last=False)
+        
+        # Straight to the link instead of the transmit queue, which may be full of images
+        try:
+            self.writer.write(f"{reply}\n".encode())
+        except Exception as e:
+            print(f"Error acknowledging command: {e}")
     
     def process_command(self, command):
+        """Execute one command; returns False for commands this controller doesn't know"""
         if command.startswith("ROTATE:"):
             parts = command.split(":")
             if len(parts) == 2:
@@ -120,14 +343,35 @@ class SatelliteController:
                 if len(coords) == 3:
                     x, y, z = map(int, coords)
                     print(f"Rotating satellite: X={x}, Y={y}, Z={z}")
+        
+        elif command.startswith("CONFIG:"):
+            # CONFIG:<satellite_id>:X<x>:Y<y>:Z<z> from the ground station dashboard
+            axes = {part[0]: float(part[1:]) for part in command.split(":")[2:] if part}
+            print(f"Rotating satellite: X={axes.get('X')}, Y={axes.get('Y')}, Z={axes.get('Z')}")
                     
         elif command == "TAKE_PHOTO":
-            ret, frame = self.camera.read()
-            if ret:
-                self.send_image_to_arduino(frame)
+            # The camera belongs to the capture thread; send its latest frame
+            frame = self.latest_frame
+            if frame is not None:
+                self.queue_downlink('image', frame.copy())
                 
         elif command == "SYSTEM_RESET":
             print("System reset command received")
+        
+        elif command.startswith("IMG_NACK:"):
+            # IMG_NACK:<image_id>:<seq>,<seq>,...
+            parts = command.split(":")
+            if len(parts) == 3 and self.downlink:
+                seqs = [int(seq) for seq in parts[2].split(",") if seq]
+                self.queue_downlink('resend', (int(parts[1]), seqs))
+        
+        elif command.startswith("IMG_ACK:"):
+            if self.downlink:
+                self.downlink.acknowledge(int(command.split(":")[1]))
+        
+        else:
+            return False
+        return True
     
     def run(self):
         if not self.initialize_camera():
@@ -138,73 +382,68 @@ class SatelliteController:
         
         print("SIT-Space Satellite Detection System Ready")
         
-        last_detection_time = 0
-        detection_cooldown = 5  
+        detection_cooldown = Cooldown(DETECTION_COOLDOWN)
+        scheduler = PeriodicScheduler()
+        scheduler.every(STATS_INTERVAL, self.print_stats)
+        if self.serial_conn:
+            scheduler.every(IMAGE_INTERVAL, self.send_periodic_image)
+            scheduler.every(HEALTH_INTERVAL, lambda: self.queue_downlink('health', self.health_message()))
         
+        self.start_pipeline()
         try:
-            while True:
-                ret, frame = self.camera.read()
-                if not ret:
-                    break
-                
-                self.frame_count += 1
-                detected, mask, area_ratio = self.detect_oil_spill(frame)
+            while self.running.is_set():
+                scheduler.run_pending()
                 
-                if detected:
-                    current_time = time.time()
-                    if current_time - last_detection_time > detection_cooldown:
-                        cv2.putText(frame, "OIL SPILL DETECTED",
-                                  (20, 40),
-                                  cv2.FONT_HERSHEY_SIMPLEX,
-                                  1, (0, 0, 255), 2)
-                        
-                        if self.serial_conn:
-                            self.send_zone_alert(area_ratio, self.frame_count)
-                            self.send_image_to_arduino(frame)
-                        
-                        last_detection_time = current_time
-                else:
-                    cv2.putText(frame, "Monitoring...",
-                              (20, 40),
-                              cv2.FONT_HERSHEY_SIMPLEX,
-                              0.7, (0, 255, 0), 2)
+                try:
+                    frame_count, frame, mask, detected, area_ratio, roi = self.result_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
                 
-                cv2.putText(frame, f"Frame: {self.frame_count}",
-                          (20, FRAME_HEIGHT - 60),
-                          cv2.FONT_HERSHEY_SIMPLEX,
-                          0.5, (255, 255, 255), 1)
+                if detected and self.serial_conn and detection_cooldown.ready():
+                    self.queue_downlink('alert', (area_ratio, frame_count))
+                    # Headless frames are never drawn on, so they can be sent as is
+                    self.queue_downlink('roi_image', (frame if self.headless else frame.copy(), roi))
                 
-                cv2.putText(frame, f"Area Ratio: {area_ratio:.4f}",
-                          (20, FRAME_HEIGHT - 40),
-                          cv2.FONT_HERSHEY_SIMPLEX,
-                          0.5, (255, 255, 255), 1)
+                if self.headless:
+                    continue
                 
-                cv2.putText(frame, f"Status: {'DETECTED' if detected else 'CLEAR'}",
-                          (20, FRAME_HEIGHT - 20),
-                          cv2.FONT_HERSHEY_SIMPLEX,
-                          0.5, (0, 255, 0) if not detected else (0, 0, 255), 1)
+                self.draw_overlay(frame, frame_count, detected, area_ratio)
                 cv2.imshow("SIT-Space Satellite View", frame)
                 cv2.imshow("Detection Mask", mask)
-                if self.serial_conn:
-                    self.listen_for_commands()
                 if cv2.waitKey(1) & 0xFF == 27:
                     break
-                if self.frame_count % 900 == 0 and self.serial_conn:  # ~30 seconds at 30fps
-                    self.send_image_to_arduino(frame)
         
         except KeyboardInterrupt:
             print("\nShutting down...")
         
         finally:
+            self.stop_pipeline()
             self.cleanup()
     
     def cleanup(self):
-        if self.camera:
+        # Closing a device under a thread still using it can crash the driver;
+        # threads left over by stop_pipeline() are daemons and end with the process
+        running = {thread.name for thread in self.threads}
+        if self.camera and 'capture_loop' not in running:
             self.camera.release()
         if self.serial_conn:
-            self.serial_conn.close()
-        cv2.destroyAllWindows()
+            if running & {'transmit_loop', 'command_loop'}:
+                print("Serial link still in use, leaving it open")
+            else:
+                self.serial_conn.close()
+        if not self.headless:
+            cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    controller = SatelliteController()
+    parser = argparse.ArgumentParser(description="SIT-Space satellite detection")
+    parser.add_argument('--headless', action='store_true',
+                        help="no display windows or overlays (default when there is no display)")
+    parser.add_argument('--workers', type=int, default=DETECTION_WORKERS)
+    parser.add_argument('--temporal', action='store_true',
+                        help="smooth detections over time and skip unchanged frames")
+    args = parser.parse_args()
+    
+    headless = args.headless or (sys.platform.startswith('linux') and not os.environ.get('DISPLAY'))
+    controller = SatelliteController(detection_workers=args.workers, headless=headless,
+                                     temporal=args.temporal)
     controller.run()
\ No newline at end of file
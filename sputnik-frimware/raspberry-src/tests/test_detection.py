@@ -0,0 +1,58 @@
+import numpy as np
+
+import detection
+from detection import CnnVerifier
+
+
+class FakeInterpreter:
+    """Scores each region by its mean brightness"""
+
+    def __init__(self):
+        self.input = None
+
+    def get_input_details(self):
+        return [{'index': 0}]
+
+    def get_output_details(self):
+        return [{'index': 1}]
+
+    def resize_tensor_input(self, index, shape):
+        pass
+
+    def allocate_tensors(self):
+        pass
+
+    def set_tensor(self, index, value):
+        self.input = value
+
+    def invoke(self):
+        pass
+
+    def get_tensor(self, index):
+        return self.input.mean(axis=(1, 2, 3)).reshape(-1, 1)
+
+
+def make_verifier(monkeypatch, **kwargs):
+    monkeypatch.setattr(detection, 'load_interpreter', lambda path: FakeInterpreter())
+    return CnnVerifier('model.tflite', **kwargs)
+
+
+def test_offline_verifier_scores_every_region_fresh(monkeypatch):
+    verifier = make_verifier(monkeypatch, max_per_frame=None, cache_ttl=0)
+    bboxes = [(x * 20, 0, 16, 16) for x in range(12)]
+    dark = np.zeros((64, 320, 3), np.uint8)
+    bright = np.full((64, 320, 3), 255, np.uint8)
+    assert verifier.score_regions(dark, bboxes) == [0.0] * 12
+    # Same boxes in another image must not reuse the previous scores
+    assert verifier.score_regions(bright, bboxes) == [1.0] * 12
+
+
+def test_live_verifier_caps_and_caches(monkeypatch):
+    verifier = make_verifier(monkeypatch)
+    bboxes = [(x * 20, 0, 16, 16) for x in range(12)]
+    frame = np.zeros((64, 320, 3), np.uint8)
+    scores = verifier.score_regions(frame, bboxes)
+    assert scores.count(None) == 4
+    invocations = verifier.invocations
+    verifier.score_regions(frame, bboxes[:8])
+    assert verifier.invocations == invocations
@@ -0,0 +1,136 @@
+"""End to end: Pi -> controller -> radio -> ground receiver pty -> ingestion and back"""
+import os
+import random
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+import tty
+
+from downlink import IMAGE_CHUNK, IMAGE_START, IMAGE_SYNC, ImageDownlink
+from pipeline import LockedWriter
+from sputnic import SatelliteController
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'service-src'))
+from image_downlink import IMAGE_HEADER_SIZE, ImageReassembler  # noqa: E402
+from ingestion import SerialSource, TelemetryIngestor  # noqa: E402
+
+AIRTIME = 0.02
+
+
+class SocketWriter:
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+
+class ControllerSim(threading.Thread):
+    """Relays like controller-src/main.ino: one frame per radio packet, then IMG_READY.
+
+    Uplink lines from the ground are passed straight to the Pi. drop holds
+    (type, seq) of frames lost on air, each once.
+    """
+
+    def __init__(self, pi_sock, radio_fd, drop=()):
+        super().__init__(daemon=True)
+        self.pi_sock = pi_sock
+        self.radio_fd = radio_fd
+        self.drop = set(drop)
+        self.stopping = threading.Event()
+        self.relayed = []
+        self.overruns = 0
+
+    def run(self):
+        buffer = b''
+        while not self.stopping.is_set():
+            readable, _, _ = select.select([self.pi_sock, self.radio_fd], [], [], 0.05)
+            if self.radio_fd in readable:
+                self.pi_sock.sendall(os.read(self.radio_fd, 4096))
+            if self.pi_sock not in readable:
+                continue
+            buffer += self.pi_sock.recv(4096)
+            while len(buffer) >= IMAGE_HEADER_SIZE:
+                assert buffer.startswith(IMAGE_SYNC)
+                size = IMAGE_HEADER_SIZE + buffer[IMAGE_HEADER_SIZE - 1] + 2
+                if len(buffer) < size:
+                    break
+                frame, buffer = buffer[:size], buffer[size:]
+                frame_type, seq = frame[2], struct.unpack_from('<H', frame, 5)[0]
+                if (frame_type, seq) in self.drop:
+                    self.drop.discard((frame_type, seq))
+                else:
+                    os.write(self.radio_fd, frame)
+                    self.relayed.append((frame_type, seq))
+                time.sleep(AIRTIME)
+                # Anything sent while the radio was busy would overflow the UART buffer
+                if buffer or select.select([self.pi_sock], [], [], 0)[0]:
+                    self.overruns += 1
+                self.pi_sock.sendall(b"IMG_READY\n")
+
+
+def transfer(image, reassembler, drop=(), image_id=None):
+    """Send image through the whole loop; returns (image_id, downlink, controller)"""
+    pi_sock, controller_sock = socket.socketpair()
+    master, slave = os.openpty()
+    tty.setraw(slave)
+
+    ingestor = TelemetryIngestor([SerialSource(os.ttyname(slave))], lambda frames: None,
+                                 image_reassembler=reassembler)
+    controller = ControllerSim(controller_sock, master, drop)
+
+    pi = SatelliteController(headless=True)
+    pi.serial_conn = pi_sock.makefile('rb')
+    pi.writer = LockedWriter(SocketWriter(pi_sock))
+    pi.downlink = ImageDownlink(pi.writer)
+    if image_id is not None:
+        pi.downlink.next_id = image_id
+    pi.running.set()
+    threads = [threading.Thread(target=target, daemon=True) for target in (pi.command_loop, pi.transmit_loop)]
+
+    ingestor.start()
+    controller.start()
+    for thread in threads:
+        thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not ingestor.sources[0].connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        image_id = pi.downlink.send(image)
+        deadline = time.monotonic() + 10
+        while image_id in pi.downlink.pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        controller.stopping.set()
+        controller.join()
+        pi.running.clear()
+        pi_sock.shutdown(socket.SHUT_RDWR)
+        ingestor.stop()
+        os.close(slave)
+        os.close(master)
+    return image_id, pi.downlink, controller
+
+
+def test_dropped_chunk_is_nacked_resent_and_acked():
+    reassembler = ImageReassembler()
+    image = random.Random(1).randbytes(300)
+    image_id, downlink, controller = transfer(image, reassembler, drop={(IMAGE_CHUNK, 2)})
+
+    # ACKed, so the Pi dropped it from its resend cache
+    assert image_id not in downlink.pending
+    assert reassembler.get(image_id)['data'] == image
+    assert controller.relayed.count((IMAGE_CHUNK, 2)) == 1
+    assert controller.overruns == 0
+
+
+def test_reused_id_after_reboot_is_not_acked_as_old_image():
+    reassembler = ImageReassembler()
+    old = random.Random(2).randbytes(100)
+    image_id, _, _ = transfer(old, reassembler)
+    # The Pi reboots, reuses the id and the new image's START is lost
+    new = random.Random(3).randbytes(300)
+    transfer(new, reassembler, drop={(IMAGE_START, 0)}, image_id=image_id)
+    assert reassembler.get(image_id)['data'] == new
@@ -0,0 +1,44 @@
+from sputnic import SatelliteController
+
+
+class FakeSerial:
+    """Serves queued uplink lines to readline(), then stops the controller"""
+
+    def __init__(self, controller, lines):
+        self.controller = controller
+        self.lines = list(lines)
+
+    def readline(self):
+        if not self.lines:
+            self.controller.running.clear()
+            return b''
+        return self.lines.pop(0)
+
+
+class Recorder:
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+
+def make_controller(lines):
+    controller = SatelliteController(headless=True)
+    controller.serial_conn = FakeSerial(controller, lines)
+    controller.writer = Recorder()
+    controller.running.set()
+    return controller
+
+
+def test_malformed_lines_do_not_stop_the_command_reader():
+    controller = make_controller([b"ROTATE:1,2,x\n", b"IMG_NACK:1:a\n", b"CMD:7:1:SYSTEM_RESET\n"])
+    controller.command_loop()
+    assert controller.writer.written == [b"CMD_ACK:7\n"]
+
+
+def test_malformed_numbered_command_is_nacked():
+    controller = make_controller([b"CMD:8:1:ROTATE:1,2,x\n", b"CMD:9:1:SYSTEM_RESET\n"])
+    controller.command_loop()
+    assert controller.writer.written[0].startswith(b"CMD_NAK:8:")
+    assert controller.writer.written[1] == b"CMD_ACK:9\n"